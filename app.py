@@ -1,28 +1,61 @@
 from datetime import datetime, timedelta, date
-from calendar import monthrange
 import math
 import re
-from io import BytesIO
 from collections import defaultdict
+from functools import lru_cache, cmp_to_key
+import heapq
+from operator import itemgetter
 import pandas as pd
-import geopandas as gpd
-import matplotlib
-import matplotlib.pyplot as plt
-import requests
-from flask import Flask, request, Response
+from flask import Flask, request, Response, make_response
 from flask_restx import Api, Resource, fields, reqparse
-from shapely.geometry import Point
 import util.validation as validation
 import util.constants as const
-from util.sql import execute_query
+from util.sql import execute_query, init_db
+from util.writer import execute_write
 import util.helper as util
+import util.cache as cache
+import util.output as output
+import util.geo as geo
+import util.render as render
+import util.changes as changes
+import util.archive as archive
+import util.diagnostics as diagnostics
+from util.recurrence import Recurrence, expand_events, event_dates, \
+    get_recurrence, save_recurrence, parse_date, get_horizon
 
-execute_query(const.SCHEMA)
 app = Flask(__name__)
 api = Api(app,
           default=const.API_NAME,
           title=const.API_NAME,
           description=const.API_DESCRIPTION,)
+app.before_request(diagnostics.before_request)
+# Registered first so that it runs last, after the response is compressed
+app.after_request(diagnostics.after_request)
+app.after_request(output.compress)
+
+
+@api.representation('application/json')
+def output_json(data, code, headers=None):
+    response = make_response(output.dumps(data), code)
+    response.headers.extend(headers or {})
+    response.mimetype = 'application/json'
+    return response
+
+
+# Start memory diagnostics and create the database and cache. Each entry point
+# calls this rather than it running on import, as a render process imports
+# the script that started the server again and must not repeat it
+def init_app():
+    diagnostics.start()
+    init_db()
+    cache.init_cache()
+
+
+# Response for an image request when the render processes are overloaded
+def render_busy():
+    return {"Error": "Too many images are being rendered, try again later"}, 503, \
+        {'Retry-After': str(const.RENDER_RETRY_AFTER)}
+
 
 # Schema of an event payload
 event_model = api.model('Event', {
@@ -36,7 +69,14 @@ event_model = api.model('Event', {
         'state': fields.String(example="NSW"),
         'post-code': fields.String(example="2033")
     })),
-    "description": fields.String(example="The cake is a lie")
+    "description": fields.String(example="The cake is a lie"),
+    "recurrence": fields.Nested(api.model('Recurrence', {
+        'freq': fields.String(example="weekly"),
+        'interval': fields.Integer(example=1),
+        'count': fields.Integer(example=10),
+        'until': fields.Date(example="2000-12-31"),
+        'exceptions': fields.List(fields.Date, example=["2000-01-15"])
+    }))
 })
 
 
@@ -61,28 +101,40 @@ class CreateEvent(Resource):
         if validation_errors:
             return {"Errors": validation_errors}, 400
 
-        # Check if event overlaps with another event
-        if validation.is_event_overlap((request_data['date'],
-                                        request_data['to'],
-                                        request_data['from'])):
-            return {"Error": "Event overlaps with another event"}, 400
+        recurrence = None
+        if 'recurrence' in request_data:
+            recurrence = Recurrence.from_data(request_data['date'],
+                                              request_data['recurrence'])
         curr_time = util.get_datetime_in_format(datetime.now())
-        event_id = util.get_total_events() + 1
-        execute_query(
-            "INSERT INTO events VALUES(NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (request_data['name'],
-             request_data['date'],
-             request_data['from'],
-             request_data['to'],
-             request_data['location']['street'],
-             request_data['location']['suburb'],
-             request_data['location']['state'],
-             request_data['location']['post-code'],
-             request_data['description'],
-             curr_time))
-
-        return {'id': int(event_id), 'last-update': curr_time,
-                '_links': {'self': {'href': f'/events/{str(event_id)}'}}}, 201
+
+        def create(connection):
+            # Check if event overlaps with another event
+            if validation.is_event_overlap((request_data['date'],
+                                            request_data['to'],
+                                            request_data['from']),
+                                           recurrence, connection=connection):
+                return {"Error": "Event overlaps with another event"}, 400
+            cursor = connection.execute(
+                "INSERT INTO events VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (archive.next_id(connection),
+                 request_data['name'],
+                 request_data['date'],
+                 request_data['from'],
+                 request_data['to'],
+                 request_data['location']['street'],
+                 request_data['location']['suburb'],
+                 request_data['location']['state'],
+                 request_data['location']['post-code'],
+                 request_data['description'],
+                 curr_time))
+            event_id = cursor.lastrowid
+            if recurrence is not None:
+                save_recurrence(event_id, recurrence, connection)
+            changes.record_change(event_id, changes.CREATED, curr_time, connection)
+
+            return {'id': int(event_id), 'last-update': curr_time,
+                    '_links': {'self': {'href': f'/events/{str(event_id)}'}}}, 201
+        return execute_write(create)
 
     order_parser = reqparse.RequestParser()
     order_parser.add_argument(
@@ -102,6 +154,16 @@ class CreateEvent(Resource):
             date, from, to, and location**), and shows what attribute should be shown for each\
             event accordingly.',
         default='id,name')
+    order_parser.add_argument(
+        'start',
+        type=str,
+        help='Start of the date window in the format ``YYYY-MM-DD``. When a window is given,\
+            recurring events are listed once per occurrence within it. Defaults to today')
+    order_parser.add_argument(
+        'end',
+        type=str,
+        help='End of the date window in the format ``YYYY-MM-DD``. Defaults to a year after\
+            the later of today and the start of the window')
 
     @api.response(200, 'Successfully Retrieved All Events')
     @api.response(400, 'Validation Error')
@@ -115,6 +177,8 @@ class CreateEvent(Resource):
         arg_page = args['page']
         arg_size = args['size']
         arg_filter = args['filter']
+        arg_start = args['start']
+        arg_end = args['end']
 
         # Validate arg_order
         # Translation table that removes characters with ASCII codes 43 (+) and 45 (-)
@@ -140,17 +204,24 @@ class CreateEvent(Resource):
                 arg_filter.split(',')):
             return {"Error": "Invalid filter query"}, 400
 
+        # Validate arg_start and arg_end
+        if (arg_start and not validation.date(arg_start)) or (
+                arg_end and not validation.date(arg_end)):
+            return {"Error": "Invalid window query"}, 400
+        window = arg_start is not None or arg_end is not None
+        if window:
+            start = parse_date(arg_start) if arg_start else date.today()
+            end = parse_date(arg_end) if arg_end else get_horizon(start)
+            if start > end:
+                return {"Error": "Invalid window query"}, 400
+            if (end - start).days > const.MAX_WINDOW_DAYS:
+                return {"Error": f"Invalid window query, a window can be at most "
+                        f"{const.MAX_WINDOW_DAYS} days"}, 400
+
         # If the filter query contains location, from or to then replace them
         # with their corresponding attribute names
-        arg_filter = [
-            v if v not in {
-                'location',
-                'from',
-                'to'} else {
-                'location': 'street,suburb,state,post_code',
-                'from': 'time_from',
-                'to': 'time_to'}[v] for v in arg_filter.split(',')]
-        arg_filter = ','.join(arg_filter)
+        arg_filter = ','.join(const.FILTER_COLUMNS.get(v, v)
+                              for v in arg_filter.split(','))
 
         # Construct order string
         order_criteria = []
@@ -165,44 +236,52 @@ class CreateEvent(Resource):
                     f"{attr_name} {const.ORDER_DIRECTION[order_type]}")
         order_string = ', '.join(date_criteria + order_criteria)
 
-        result = execute_query(
-            f"SELECT {arg_filter} FROM 'events'\
-            ORDER BY {order_string}\
-            LIMIT {arg_size}\
-            OFFSET {(arg_page - 1) * arg_size}"
-        )
+        offset = (arg_page - 1) * arg_size
+        if window:
+            # Expand recurring events within the window, keeping only the rows
+            # up to the end of the page in order, and counting the rest
+            total_events = 0
+
+            def counted(rows):
+                nonlocal total_events
+                for row in rows:
+                    total_events += 1
+                    yield row
+            rows = heapq.nsmallest(offset + arg_size, counted(expand_events(
+                f"id,name,date,time_from,{arg_filter}", start, end,
+                archive.get_tables(start, end))), key=window_order_key(arg_order))
+            result = [row[4:] for row in rows[offset:]]
+            window_query = f"&start={start}&end={end}"
+        else:
+            # Archived events are only read when the page may include them
+            table = archive.get_list_table(
+                offset + arg_size, arg_order.split(',')[0] == '-datetime')
+            result = execute_query(
+                f"SELECT {arg_filter} FROM {table}\
+                ORDER BY {order_string}\
+                LIMIT {arg_size}\
+                OFFSET {offset}"
+            )
+            total_events = util.get_total_events()
+            window_query = ""
         if not result:
             return {"Error": f"No events found on page {arg_page}"}, 404
 
         # Construct links
         links = {
             "self": {
-                "href": f"/events?order={arg_order}&page={arg_page}&size={arg_size}&filter={arg_filter}",
+                "href": f"/events?order={arg_order}&page={arg_page}&size={arg_size}&filter={arg_filter}{window_query}",
             },
         }
-        num_pages = math.ceil(util.get_total_events() / arg_size)
+        num_pages = math.ceil(total_events / arg_size)
         if arg_page < num_pages:
             links["next"] = {
-                "href": f"/events?order={arg_order}&page={arg_page + 1}&size={arg_size}&filter={arg_filter}",
+                "href": f"/events?order={arg_order}&page={arg_page + 1}&size={arg_size}&filter={arg_filter}{window_query}",
             }
 
         # Construct events
-        events = []
-        for row in result:
-            event = {}
-            for i, field in enumerate(arg_filter.split(',')):
-                if field == 'time_from':
-                    event['time'] = row[i]
-                elif field == 'time_to':
-                    event['to'] = row[i]
-                elif field in {'street', 'suburb', 'state', 'post_code'}:
-                    event.setdefault(
-                        'location', {})[
-                        field.replace(
-                            '_', '-')] = row[i]
-                else:
-                    event[field] = row[i]
-            events.append(event)
+        project = output.compile_projection(arg_filter.split(','))
+        events = [project(row) for row in result]
 
         return {
             "page": arg_page,
@@ -212,6 +291,128 @@ class CreateEvent(Resource):
         }, 200
 
 
+# Sort key of the rows of a window for an order query, comparing them by
+# each order criteria in turn
+def window_order_key(arg_order):
+    criteria = []
+    for order in arg_order.split(','):
+        order_type, attr_name = order[0], order[1:]
+        criteria.append((itemgetter(2, 3) if attr_name == 'datetime' else itemgetter(
+            ['id', 'name'].index(attr_name)), order_type == '-'))
+
+    def compare(row, other):
+        for key, descending in criteria:
+            a, b = key(row), key(other)
+            if a != b:
+                return (a < b) - (a > b) if descending else (a > b) - (a < b)
+        return 0
+    return cmp_to_key(compare)
+
+
+# Get an event from the events table or the archives, with the events before
+# and after it and its recurrence, or None if it doesn't exist
+def get_event(id):
+    event = execute_query(
+        "SELECT * FROM events WHERE id = ?", (id,))
+    if event:
+        event = event[0]
+    else:
+        archived = archive.find_event(id)
+        if archived is None:
+            return None
+        event = archived[1]
+    return event, archive.get_previous(event), archive.get_next(event), \
+        get_recurrence(id, event[2])
+
+
+# Response body of an event, with its metadata from the holidays of this year
+# and the forecast at its location, if it could be located
+def event_response(event, previous_event, next_event, recurrence, holidays, forecast):
+    id = event[0]
+
+    # Get links data
+    links = {
+        'self': {
+            'href': f'/events/{str(id)}'
+        }
+    }
+    if previous_event:
+        links['previous'] = {
+            'href': f'/events/{str(previous_event[0])}'}
+    if next_event:
+        links['next'] = {'href': f'/events/{str(next_event[0])}'}
+
+    # Get holiday and weekend data
+    metadata = {}
+    metadata['weekend'] = datetime.strptime(
+        event[2], '%Y-%m-%d').date().weekday() >= 5
+    for holiday in holidays:
+        if holiday['date'] == event[2]:
+            metadata['holiday'] = holiday['name']
+            break
+
+    # Get weather data
+    if forecast is not None:
+        init_date_obj = datetime.strptime(forecast.get('init'), '%Y%m%d%H')
+        event_date_obj = datetime.strptime(event[2], '%Y-%m-%d').date()
+        from_time_obj = datetime.strptime(event[3], '%H:%M:%S').time()
+
+        event_datetime_obj = datetime.combine(
+            event_date_obj, from_time_obj)
+        event_datetime_utc_str = str(
+            util.convert_to_utc(event_datetime_obj))
+        event_datetime_utc_str_without_tz = event_datetime_utc_str[:-6]
+        event_datetime_utc_obj = datetime.strptime(
+            event_datetime_utc_str_without_tz, '%Y-%m-%d %H:%M:%S')
+
+        # Check if date and from_time is within a valid range
+        start_time = init_date_obj + timedelta(hours=3)
+        end_time = init_date_obj + timedelta(hours=195)
+        if (event_datetime_utc_obj >= start_time) and (
+                event_datetime_utc_obj < end_time):
+            dataseries = forecast.get('dataseries')
+            hours_between = (
+                event_datetime_utc_obj - init_date_obj).total_seconds() // 3600
+            # Calculate the number of dataseries elements that fall within the time period
+            count = sum(1 for d in forecast.get(
+                'dataseries') if 0 <= d.get('timepoint') <= hours_between) - 1
+            metadata['cloud-cover'] = const.CLOUD_COVER.get(
+                dataseries[count].get('cloudcover'))
+            metadata['precepitation-type'] = const.PRECEPICTION_TYPE.get(
+                dataseries[count].get('prec_type'))
+            prec_amount = const.PRECEPICTION_RATE.get(
+                dataseries[count].get('prec_amount'))
+            if prec_amount != 'None':
+                metadata['precepitation-rate'] = prec_amount
+            metadata['wind-speed'] = const.WEATHER_SPEED.get(
+                dataseries[count].get('wind10m').get('speed'))
+            metadata['weather'] = const.WEATHER_CONDITION.get(
+                dataseries[count].get('weather'))
+            metadata['humidity'] = dataseries[count].get('rh2m')
+            metadata['temperature'] = f"{dataseries[count].get('temp2m')} °C"
+
+    event_data = {
+        'id': event[0],
+        'last-update': event[10],
+        'name': event[1],
+        'date': event[2],
+        'from': event[3],
+        'to': event[4],
+        'location': {
+            'street': event[5],
+            'suburb': event[6],
+            'state': event[7],
+            'post-code': event[8]
+        },
+        'description': event[9],
+        '_metadata': metadata,
+        '_links': links
+    }
+    if recurrence is not None:
+        event_data['recurrence'] = recurrence.to_dict()
+    return event_data
+
+
 @api.route('/events/<int:id>')
 @api.param('id', 'The event identifier')
 class Events(Resource):
@@ -222,147 +423,46 @@ class Events(Resource):
     @api.doc(description="Get an event by its ``ID``")
     def get(self, id):
         '''Get an event by its ID'''
-        event = execute_query(
-            "SELECT * FROM events WHERE id = ?", (id,))
-        if not event:
+        found = get_event(id)
+        if found is None:
             return {"Error": f"Event {id} doesn't exist"}, 404
-        else:
-            event = event[0]
-        previous_event = execute_query(
-            "SELECT * FROM events WHERE date < ? OR (date = ? AND time_to < ?)\
-                ORDER BY date DESC, time_to DESC LIMIT 1",
-            (event[2],
-             event[2],
-                event[3]))
-        next_event = execute_query(
-            "SELECT * FROM events WHERE date > ? OR (date = ? AND time_from > ?)\
-                ORDER BY date ASC, time_from ASC LIMIT 1",
-            (event[2],
-             event[2],
-                event[4]))
-
-        # Get links data
-        links = {
-            'self': {
-                'href': f'/events/{str(id)}'
-            }
-        }
-        if previous_event:
-            links['previous'] = {
-                'href': f'/events/{str(previous_event[0][0])}'}
-        if next_event:
-            links['next'] = {'href': f'/events/{str(next_event[0][0])}'}
-
-        # Get holiday and weekend data
-        metadata = {}
-        metadata['weekend'] = datetime.strptime(
-            event[2], '%Y-%m-%d').date().weekday() >= 5
-        url = f"https://date.nager.at/api/v2/publicholidays/{datetime.now().year}/AU"
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            for holiday in data:
-                if holiday['date'] == event[2]:
-                    metadata['holiday'] = holiday['name']
-                    break
-        else:
+        event = found[0]
+
+        holidays = util.get_holidays(datetime.now().year)
+        if holidays is None:
             return {"Error": "Error getting holiday data from NagerDate"}, 500
 
-        # Get weather data
-        geo_df = pd.read_csv("data/au_geo.csv", delimiter=';')
-        geo_df = geo_df.drop(
-            columns=[
-                'Geo Shape',
-                'Year',
-                'Official Code State',
-                'Official Code Local Government Area',
-                'Official Name Local Government Area',
-                'Official Code Suburb',
-                'Iso 3166-3 Area Code',
-                'Type'])
-        df = geo_df[['Geo Point', 'Official Name Suburb',
-                        'Official Name State']].dropna()
-        rows = df[df['Official Name Suburb'].str.contains(
-            event[6]) & df['Official Name State'].str.contains(const.STATE_ABBREVIATIONS[event[7].upper()])]
-
-        # Check if there exists a suburb with the same name in the same state
-        if not rows.empty:
-            # Get the first row from row dataframe
-            row = rows.iloc[0]
-            lat, lng = row['Geo Point'].split(',')[0].replace(' ', ''), row['Geo Point'].split(',')[1].replace(' ', '')
-            url = f"https://www.7timer.info/bin/civil.php?lon={lng}&lat={lat}&lang=en&ac=0&unit=metric&output=json"
-            response = requests.get(url)
-            if response.status_code == 200:
-                init_date_obj = datetime.strptime(response.json().get('init'), '%Y%m%d%H')
-                event_date_obj = datetime.strptime(event[2], '%Y-%m-%d').date()
-                from_time_obj = datetime.strptime(event[3], '%H:%M:%S').time()
-
-                event_datetime_obj = datetime.combine(
-                    event_date_obj, from_time_obj)
-                event_datetime_utc_str = str(
-                    util.convert_to_utc(event_datetime_obj))
-                event_datetime_utc_str_without_tz = event_datetime_utc_str[:-6]
-                event_datetime_utc_obj = datetime.strptime(
-                    event_datetime_utc_str_without_tz, '%Y-%m-%d %H:%M:%S')
-
-                # Check if date and from_time is within a valid range
-                start_time = init_date_obj + timedelta(hours=3)
-                end_time = init_date_obj + timedelta(hours=195)
-                if (event_datetime_utc_obj >= start_time) and (
-                        event_datetime_utc_obj < end_time):
-                    dataseries = response.json().get('dataseries')
-                    hours_between = (
-                        event_datetime_utc_obj - init_date_obj).total_seconds() // 3600
-                    # Calculate the number of dataseries elements that fall within the time period
-                    count = sum(1 for d in response.json().get(
-                        'dataseries') if 0 <= d.get('timepoint') <= hours_between) - 1
-                    metadata['cloud-cover'] = const.CLOUD_COVER.get(
-                        dataseries[count].get('cloudcover'))
-                    metadata['precepitation-type'] = const.PRECEPICTION_TYPE.get(
-                        dataseries[count].get('prec_type'))
-                    prec_amount = const.PRECEPICTION_RATE.get(
-                        dataseries[count].get('prec_amount'))
-                    if prec_amount != 'None':
-                        metadata['precepitation-rate'] = prec_amount
-                    metadata['wind-speed'] = const.WEATHER_SPEED.get(
-                        dataseries[count].get('wind10m').get('speed'))
-                    metadata['weather'] = const.WEATHER_CONDITION.get(
-                        dataseries[count].get('weather'))
-                    metadata['humidity'] = dataseries[count].get('rh2m')
-                    metadata['temperature'] = f"{dataseries[count].get('temp2m')} °C"
-            else:
+        # Check if the location could be found from its suburb or postcode
+        forecast = None
+        geo_point = geo.locate(event[6], event[7], event[8])
+        if geo_point is not None:
+            forecast = util.get_forecast(*geo_point)
+            if forecast is None:
                 return {"Error": "Error getting weather data from 7timer"}, 500
 
-        return {
-            'id': event[0],
-            'last-update': event[10],
-            'name': event[1],
-            'date': event[2],
-            'from': event[3],
-            'to': event[4],
-            'location': {
-                'street': event[5],
-                'suburb': event[6],
-                'state': event[7],
-                'post-code': event[8]
-            },
-            'description': event[9],
-            '_metadata': metadata,
-            '_links': links
-        }, 200
+        return event_response(*found, holidays, forecast), 200
 
     @api.response(404, 'Event Was Not Found')
     @api.response(200, 'Event Deleted Successfully')
     @api.doc(description="Delete an event by its ``ID``")
     def delete(self, id):
         '''Delete an event by its ID'''
-        event = execute_query("SELECT * FROM events WHERE id = ?", (id,))
-        if not event:
-            return {"Error": f"Event {id} doesn't exist"}, 404
 
-        execute_query("DELETE FROM events WHERE id = ?", (id,))
-        return {
-            "message": f"The event with id {id} has been removed", "id": id}, 200
+        def remove(connection):
+            # Archived events are restored to the events table to be deleted
+            event = execute_query(
+                "SELECT * FROM events WHERE id = ?", (id,), connection)
+            if not event and not archive.restore(id, connection):
+                return {"Error": f"Event {id} doesn't exist"}, 404
+
+            execute_query("DELETE FROM events WHERE id = ?", (id,), connection)
+            execute_query(
+                "DELETE FROM recurrences WHERE event_id = ?", (id,), connection)
+            changes.record_change(id, changes.DELETED,
+                                  util.get_datetime_in_format(datetime.now()), connection)
+            return {
+                "message": f"The event with id {id} has been removed", "id": id}, 200
+        return execute_write(remove)
 
     @api.response(404, 'Event Was Not Found')
     @api.response(200, 'Event Updated Successfully')
@@ -372,12 +472,10 @@ class Events(Resource):
     def patch(self, id):
         '''Update an event by its ID'''
         request_data = request.json
-        event = execute_query("SELECT * FROM events WHERE id = ?", (id,))
-        if not event:
-            return {"Error": f"Event {id} doesn't exist"}, 404
+
         # Check if request_data contains only the fields that can be updated
         data_keys = set(request_data.keys())
-        if not data_keys.issubset(const.FIELDS):
+        if not data_keys.issubset(const.FIELDS | const.OPTIONAL_FIELDS):
             return {"Error": "Invalid fields provided"}, 400
         location_data = request_data.get('location', {})
         if not set(location_data.keys()).issubset(const.LOCATION_FIELDS):
@@ -386,51 +484,116 @@ class Events(Resource):
         validation_errors = validation.all_data(request_data)
         if validation_errors:
             return {"Errors": validation_errors}, 400
-        # Check if the event overlaps with another event
-        is_overlap = validation.is_event_overlap((
-            request_data['date'] if 'date' in data_keys else execute_query(
-                "SELECT date FROM events WHERE id = ?", (id,))[0][0],
-            request_data['to'] if 'to' in data_keys else execute_query(
-                "SELECT time_to FROM events WHERE id = ?", (id,))[0][0],
-            request_data['from'] if 'from' in data_keys else execute_query(
-                "SELECT time_from FROM events WHERE id = ?", (id,))[0][0],
-        ))
-        if is_overlap and is_overlap[0][0] != id:
-            return {"Error": "Event overlaps with another event"}, 400
-
-        # Update event in database
-        curr_time = util.get_datetime_in_format(datetime.now())
-        update_query = "UPDATE events SET name = ?, date = ?, time_from = ?, time_to = ?, street = ?, suburb = ?, state = ?, post_code = ?, description = ?, last_update = ? WHERE id = ?"
-        update_params = (
-            request_data['name'] if 'name' in data_keys else execute_query(
-                "SELECT name FROM events WHERE id = ?", (id,))[0][0],
-            request_data['date'] if 'date' in data_keys else execute_query(
-                "SELECT date FROM events WHERE id = ?", (id,))[0][0],
-            request_data['from'] if 'from' in data_keys else execute_query(
-                "SELECT time_from FROM events WHERE id = ?", (id,))[0][0],
-            request_data['to'] if 'to' in data_keys else execute_query(
-                "SELECT time_to FROM events WHERE id = ?", (id,))[0][0],
-            location_data['street'] if 'street' in location_data.keys() else execute_query(
-                "SELECT street FROM events WHERE id = ?", (id,))[0][0],
-            location_data['suburb'] if 'suburb' in location_data.keys() else execute_query(
-                "SELECT suburb FROM events WHERE id = ?", (id,))[0][0],
-            location_data['state'] if 'state' in location_data.keys() else execute_query(
-                "SELECT state FROM events WHERE id = ?", (id,))[0][0],
-            location_data['post-code'] if 'post-code' in location_data.keys() else execute_query(
-                "SELECT post_code FROM events WHERE id = ?", (id,))[0][0],
-            request_data['description'] if 'description' in data_keys else execute_query(
-                "SELECT description FROM events WHERE id = ?", (id,))[0][0],
-            curr_time,
-            id
-        )
-        execute_query(update_query, update_params)
 
+        def update(connection):
+            event = execute_query(
+                "SELECT * FROM events WHERE id = ?", (id,), connection)
+            archived = not event
+            if archived:
+                found = archive.find_event(id, connection)
+                if found is None:
+                    return {"Error": f"Event {id} doesn't exist"}, 404
+                event = [found[1]]
+            event = event[0]
+            # A series keeps its rule, anchored at its new date, unless a new
+            # rule is given
+            event_date = request_data.get('date', event[2])
+            if 'recurrence' in data_keys:
+                recurrence = Recurrence.from_data(event_date,
+                                                  request_data['recurrence'])
+            else:
+                recurrence = get_recurrence(id, event_date, connection)
+            if recurrence is not None and recurrence.until is not None and \
+                    not validation.until(str(recurrence.until), event_date):
+                return {"Errors": {'until': const.INVALID_UNTIL_RANGE_MSG.format(
+                    recurrence.until)}}, 400
+            # Check if the event overlaps with another event
+            if validation.is_event_overlap((
+                event_date,
+                request_data.get('to', event[4]),
+                request_data.get('from', event[3]),
+            ), recurrence, id, connection):
+                return {"Error": "Event overlaps with another event"}, 400
+
+            # Archived events are changed in the events table, and archived
+            # again later if they are still in the past
+            if archived:
+                archive.restore(id, connection)
+            # Update event in database
+            curr_time = util.get_datetime_in_format(datetime.now())
+            update_query = "UPDATE events SET name = ?, date = ?, time_from = ?, time_to = ?, street = ?, suburb = ?, state = ?, post_code = ?, description = ?, last_update = ? WHERE id = ?"
+            update_params = (
+                request_data.get('name', event[1]),
+                request_data.get('date', event[2]),
+                request_data.get('from', event[3]),
+                request_data.get('to', event[4]),
+                location_data.get('street', event[5]),
+                location_data.get('suburb', event[6]),
+                location_data.get('state', event[7]),
+                location_data.get('post-code', event[8]),
+                request_data.get('description', event[9]),
+                curr_time,
+                id
+            )
+            execute_query(update_query, update_params, connection)
+            if 'recurrence' in data_keys:
+                save_recurrence(id, recurrence, connection)
+            changes.record_change(id, changes.UPDATED, curr_time, connection)
+
+            return {
+                "id": id,
+                "last-update": curr_time,
+                "_links": {
+                    "self": {
+                        "href": f"/events/{id}"
+                    }
+                }
+            }, 200
+        return execute_write(update)
+
+
+@api.route('/events/changes')
+class Changes(Resource):
+
+    changes_parser = reqparse.RequestParser()
+    changes_parser.add_argument(
+        'since',
+        type=int,
+        help='Continuation token - the ``next`` value of the previous response.\
+            Use 0 to get every event',
+        default=0)
+    changes_parser.add_argument(
+        'size',
+        type=int,
+        help=f'Most changes to return, up to {const.CHANGES_MAX_PAGE_SIZE}',
+        default=const.CHANGES_PAGE_SIZE)
+
+    @api.response(200, 'Successfully Retrieved Changes')
+    @api.response(400, 'Validation Error')
+    @api.doc(description="Get the events created, updated or deleted since a continuation token")
+    @api.expect(changes_parser)
+    def get(self):
+        '''Get the events created, updated or deleted since a continuation token'''
+        args = self.changes_parser.parse_args()
+        if args['since'] < 0:
+            return {"Error": "Invalid since query"}, 400
+        if not 1 <= args['size'] <= const.CHANGES_MAX_PAGE_SIZE:
+            return {"Error": "Invalid size query"}, 400
+
+        # Each event appears once, with its latest change. Created and
+        # updated events include their current data
+        changed, more = changes.get_changes(args['since'], args['size'])
+        next_token = changed[-1]['seq'] if changed else args['since']
         return {
-            "id": id,
-            "last-update": curr_time,
-            "_links": {
-                "self": {
-                    "href": f"/events/{id}"
+            'changes': changed,
+            'next': next_token,
+            'more': more,
+            '_links': {
+                'self': {
+                    'href': f"/events/changes?since={args['since']}&size={args['size']}"
+                },
+                'next': {
+                    'href': f"/events/changes?since={next_token}&size={args['size']}"
                 }
             }
         }, 200
@@ -452,6 +615,7 @@ class Statistics(Resource):
     @api.response(200, 'Successfully Retrieved Event Statistics')
     @api.response(400, 'Validation Error')
     @api.response(404, 'No Events Found')
+    @api.response(503, 'Too Many Images Being Rendered')
     @api.doc(description="Get all event statistics")
     def get(self):
         '''Get all event statistics'''
@@ -461,40 +625,33 @@ class Statistics(Resource):
             return {"Error": "Invalid format provided"}, 400
 
         # Total Number of events
-        total_events = util.get_total_events()
-        if total_events == 0:
+        if util.get_total_events() == 0:
             return {"Error": "No events found"}, 404
-        # Total Number of events in current calendar Week (Today to Sunday)
+        # Total Number of events in current calendar Week (Today to Sunday).
+        # Occurrences of recurring events are counted individually
         today = date.today()
         next_sunday = today + timedelta(days=(6 - today.weekday()) % 7)
-        total_events_current_week = execute_query(
-            "SELECT COUNT(*) FROM events WHERE date BETWEEN ? AND ?",
-            (util.get_datetime_in_format(datetime.now(), '%Y-%m-%d'), next_sunday))[0][0]
+        total_events_current_week = sum(1 for _ in event_dates(today, next_sunday)) + \
+            sum(count for _, count in archive.get_archived_days(today, next_sunday))
 
         # Total Number of events in current calendar month
         first_day = today.replace(day=1)
         last_day = today.replace(day=28) + timedelta(days=4)
 
         # Count the number of events in the current month
-        total_events_current_month = execute_query(
-            "SELECT COUNT(*) FROM events WHERE date BETWEEN ? AND ?",
-            (
-                util.get_datetime_in_format(first_day, '%Y-%m-%d'),
-                util.get_datetime_in_format(last_day, '%Y-%m-%d')
-            ))[0][0]
-
-        # Number of events per day
-        min_max_dates = execute_query(
-            "SELECT MIN(date), MAX(date) FROM events")
-        start_date = datetime.strptime(min_max_dates[0][0], '%Y-%m-%d').date()
-        end_date = datetime.strptime(min_max_dates[0][1], '%Y-%m-%d').date()
-        query_result = execute_query(
-            "SELECT date FROM events WHERE date BETWEEN ? AND ?", (start_date, end_date))
+        total_events_current_month = sum(1 for _ in event_dates(first_day, last_day)) + \
+            sum(count for _, count in archive.get_archived_days(first_day, last_day))
+
+        # Number of events per day, counting open-ended recurring events up
+        # to the recurrence horizon
         events_per_day = defaultdict(int)
-        for row in query_result:
-            event_date = datetime.strptime(row[0], '%Y-%m-%d').date()
+        for day, count in archive.get_archived_days():
+            events_per_day[util.get_datetime_in_format(
+                parse_date(day), '%d-%m-%Y')] += count
+        for event_date in event_dates():
             events_per_day[util.get_datetime_in_format(
                 event_date, '%d-%m-%Y')] += 1
+        total_events = sum(events_per_day.values())
 
         if args['format'] == 'json':
             return {
@@ -508,30 +665,68 @@ class Statistics(Resource):
             current_year = datetime.now().year
             events_per_month = {}
             for month in range(1, 13):
-                first_day = date(current_year, month, 1)
-                last_day = date(current_year, month, monthrange(current_year, month)[1])
-                total_events_current_month = execute_query(
-                    "SELECT COUNT(*) FROM events WHERE date BETWEEN ? AND ?",
-                    (util.get_datetime_in_format(
-                        first_day,
-                        '%Y-%m-%d'),
-                        util.get_datetime_in_format(
-                        last_day,
-                        '%Y-%m-%d')))[0][0]
                 events_per_month[util.get_datetime_in_format(
-                    first_day, '%b')] = total_events_current_month
+                    date(current_year, month, 1), '%b')] = 0
+            for event_date in event_dates(date(current_year, 1, 1),
+                                          date(current_year, 12, 31)):
+                events_per_month[util.get_datetime_in_format(
+                    event_date, '%b')] += 1
+            for day, count in archive.get_archived_days(date(current_year, 1, 1),
+                                                        date(current_year, 12, 31)):
+                events_per_month[util.get_datetime_in_format(
+                    parse_date(day), '%b')] += count
 
             # Plot the graph
-            fig, ax = plt.subplots()
-            ax.bar(events_per_month.keys(), events_per_month.values())
-            ax.set_xlabel('Month')
-            ax.set_ylabel('Number of Events')
-            ax.yaxis.set_major_locator(matplotlib.ticker.MaxNLocator(integer=True))
-            ax.set_title(f'Events per Month in Current Year ({current_year})')
-            buffer = BytesIO()
-            plt.savefig(buffer, format='png')
-            buffer.seek(0)
-            return Response(buffer.getvalue(), mimetype='image/png')
+            try:
+                image = render.render(render.draw_statistics, events_per_month, current_year)
+            except render.RenderBusy:
+                return render_busy()
+            return Response(image, mimetype='image/png')
+
+
+def days_until(value):
+    return (datetime.strptime(value, '%Y-%m-%d').date() - date.today()).days
+
+
+# Error of a weather date that isn't a date within the next week, or None
+def weather_date_error(value):
+    # Validate the date is in the correct format
+    if not validation.date(value):
+        return "Invalid date format provided"
+    # Validate the date is within a week
+    date_diff = days_until(value)
+    if date_diff > 7 or date_diff < 0:
+        return "Date is not within a week"
+    return None
+
+
+# Popular locations as (city, lat, lng), from the first occurrence of each in
+# the location data, read once
+@lru_cache(maxsize=None)
+def get_popular_cities():
+    au_df = pd.read_csv("data/au_location.csv")
+    au_df = au_df[au_df['city'].isin(const.POPULAR_LOCATIONS)].groupby('city').first().reset_index()
+    return [(row.city, float(row.lat), float(row.lng)) for row in au_df.itertuples()]
+
+
+# Temperature on a date date_diff days from today in a forecast, or None if
+# the forecast starts after the date
+def forecast_temperature(forecast, value, date_diff):
+    # Get first element if date is today
+    if date_diff == 0:
+        return float(forecast.get('dataseries')[0].get('temp2m'))
+    # Otherwise get 4th element of the day (midday)
+    init_date_obj = datetime.strptime(forecast.get('init'), '%Y%m%d%H')
+    event_date_obj = datetime.strptime(value, '%Y-%m-%d').date()
+    event_date_obj = datetime.combine(event_date_obj, datetime.min.time())
+    event_datetime_utc_str = str(util.convert_to_utc(event_date_obj))
+    event_datetime_utc_obj = datetime.strptime(event_datetime_utc_str[:-6], '%Y-%m-%d %H:%M:%S')
+
+    # Calculate the number of 3-hour intervals between init_date_obj and event_datetime_utc_obj
+    num_intervals = (event_datetime_utc_obj - init_date_obj).total_seconds() // (3 * 60 * 60)
+    if num_intervals < 0:
+        return None
+    return float(forecast.get('dataseries')[int(num_intervals)].get('temp2m'))
 
 
 @api.route('/weather')
@@ -550,96 +745,60 @@ class Weather(Resource):
     @api.response(200, 'Successfully Retrieved Weather')
     @api.response(400, 'Validation Error')
     @api.response(500, 'Error Retrieving Weather Data')
+    @api.response(503, 'Too Many Images Being Rendered')
     @api.doc(description="Get the weather of popular Australian cities")
     def get(self):
         '''Get the weather of popular Australian cities'''
-        # Validate the date is in the correct format
         args = self.date_parser.parse_args()
-        if not validation.date(args['date']):
-            return {"Error": "Invalid date format provided"}, 400
-        # Validate the date is within a week
-        date_diff = (datetime.strptime(args['date'], '%Y-%m-%d').date() - date.today()).days
-        if date_diff > 7 or date_diff < 0:
-            return {"Error": "Date is not within a week"}, 400
-
-        # Read the CSV file containing location data
-        au_df = pd.read_csv("data/au_location.csv")
-        au_df = au_df.drop(['country',
-                            'iso2',
-                            'admin_name',
-                            'capital',
-                            'population',
-                            'population_proper'],
-                           axis=1)
-
-        # Filter the data to include only the first occurrence of each popular location
-        au_df = au_df[au_df['city'].isin(const.POPULAR_LOCATIONS)].groupby('city').first().reset_index()
+        error = weather_date_error(args['date'])
+        if error is not None:
+            return {"Error": error}, 400
+        date_diff = days_until(args['date'])
+
+        # Reuse the image another worker already rendered for this date
+        image_key = f"weather-image:{args['date']}"
+        image = cache.get(image_key)
+        if image is not None:
+            return Response(image, mimetype='image/png')
 
         # Get the weather data for each location
-        for loc in const.POPULAR_LOCATIONS:
-            row = au_df[au_df['city'] == loc].iloc[0]
-            url = f"https://www.7timer.info/bin/civil.php?lon={row['lng']}&lat={row['lat']}&lang=en&ac=0&unit=metric&output=json"
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                row_index = au_df[au_df['city'] == loc].index[0]
-                # Get first element if date is today
-                if date_diff == 0:
-                    au_df.at[row_index, 'temperature'] = data.get('dataseries')[0].get('temp2m')
-                else:
-                    # Otherwise get 4th element of the day (midday)
-                    init_date_obj = datetime.strptime(data.get('init'), '%Y%m%d%H')
-                    event_date_obj = datetime.strptime(args['date'], '%Y-%m-%d').date()
-                    event_date_obj = datetime.combine(event_date_obj, datetime.min.time())
-                    event_datetime_utc_str = str(util.convert_to_utc(event_date_obj))
-                    event_datetime_utc_obj = datetime.strptime(event_datetime_utc_str[:-6], '%Y-%m-%d %H:%M:%S')
-
-                    # Calculate the number of 3-hour intervals between init_date_obj and event_datetime_utc_obj
-                    num_intervals = (event_datetime_utc_obj - init_date_obj).total_seconds() // (3 * 60 * 60)
-                    # If the number of intervals is negative, set temperature to None
-                    if num_intervals < 0:
-                        return {"Error": "Error retrieving weather data"}, 500
-                    else:
-                        # Update the temperature value in the dataframe
-                        au_df.at[row_index, 'temperature'] = data.get('dataseries')[int(num_intervals)].get('temp2m')
-            else:
+        cities = []
+        for city, lat, lng in get_popular_cities():
+            data = util.get_forecast(lat, lng)
+            temperature = None if data is None else \
+                forecast_temperature(data, args['date'], date_diff)
+            if temperature is None:
                 return {"Error": "Error retrieving weather data"}, 500
-        # Create a GeoDataFrame with the Point objects as the geometry column
-        geometry = [Point(xy) for xy in zip(au_df['lng'], au_df['lat'])]
-        gdf = gpd.GeoDataFrame(au_df, geometry=geometry)
+            cities.append((city, lat, lng, temperature))
 
-        matplotlib.use('Agg')
         # Plot the image
-        img = plt.imread('util/au_map.jpg')
-        fig, ax = plt.subplots(figsize=(10, 10))
-        ax.imshow(img, extent=[112.90, 153.70, -43.70, -10.50])
-
-        # Add annotation boxes to the points
-        for _, row in gdf.iterrows():
-            xy = row['geometry'].coords[0]
-            xytext = (-60, 5) if row['city'] == 'Brisbane' else (-30, 5)
-            text = f"{row['city']} {int(row['temperature'])}°C"
-            bbox_props = dict(boxstyle="round", facecolor="white", edgecolor="black")
-            ax.annotate(text, xy=row['geometry'].coords[0], xytext=xytext, textcoords="offset points", bbox=bbox_props, fontsize=8)
+        try:
+            image = render.render(render.draw_weather, cities)
+        except render.RenderBusy:
+            return render_busy()
+        cache.put(image_key, image, const.IMAGE_TTL)
 
-        # Remove x and y axis
-        ax.set_xticks([])
-        ax.set_yticks([])
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['bottom'].set_visible(False)
-        ax.spines['left'].set_visible(False)
+        return Response(image, mimetype='image/png')
 
-        # Hide the red dot plots
-        gdf.plot(ax=ax, alpha=0)
 
-        # Show the plot
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', bbox_inches='tight')
-        buffer.seek(0)
+@api.route('/diagnostics/memory')
+class MemoryDiagnostics(Resource):
 
-        return Response(buffer.getvalue(), mimetype='image/png')
+    @api.response(200, 'Successfully Retrieved Memory Report')
+    @api.response(404, 'Memory Diagnostics Are Turned Off')
+    @api.doc(description="Get the memory traced in the worker that serves the request, "
+             "its largest allocation sites, the sites that grew since the last report "
+             "and the peak allocation of each endpoint. Needs ``MEMORY_DIAGNOSTICS=1``")
+    def get(self):
+        '''Get a memory report of this worker'''
+        if not diagnostics.is_enabled():
+            return {"Error": "Memory diagnostics are turned off"}, 404
+        return diagnostics.report(), 200
 
 
 if __name__ == '__main__':
+    init_app()
+    diagnostics.handle_signal()
+    render.pool.start()
+    archive.start()
     app.run(debug=False)
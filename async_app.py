@@ -0,0 +1,177 @@
+import asyncio
+import os
+import sys
+from datetime import datetime
+from io import BytesIO
+from urllib.parse import unquote
+from aiohttp import web
+from multidict import CIMultiDict
+import util.constants as const
+import util.helper as util
+import util.cache as cache
+import util.aiosql as aiosql
+import util.output as output
+import util.geo as geo
+import util.render as render
+import util.archive as archive
+import util.diagnostics as diagnostics
+from util.upstream import async_nager_date, async_seven_timer
+import app as flask_app
+
+# Async entry point serving the same API as app.py. Getting an event and the
+# weather spend nearly all their time waiting on Nager.Date and 7Timer, so
+# they are served on an event loop, where a request waiting on a provider
+# holds a coroutine rather than a thread. They reuse the validation and
+# response bodies of the Flask resources. Every other request is passed to
+# the Flask app on a pool of threads. Run with `python async_app.py`
+
+
+def json_response(data, status=200, headers=None):
+    return web.Response(body=output.dumps(data), status=status, headers=headers,
+                        content_type='application/json')
+
+
+def render_busy():
+    data, status, headers = flask_app.render_busy()
+    return json_response(data, status, headers)
+
+
+async def get_event(request):
+    '''Get an event by its ID'''
+    id = int(request.match_info['id'])
+    found = await aiosql.run(flask_app.get_event, id)
+    if found is None:
+        return json_response({"Error": f"Event {id} doesn't exist"}, 404)
+    event = found[0]
+
+    # The holidays and the forecast are fetched together
+    fetches = [util.get_holidays_async(datetime.now().year)]
+    geo_point = geo.locate(event[6], event[7], event[8])
+    if geo_point is not None:
+        fetches.append(util.get_forecast_async(*geo_point))
+    holidays, *forecast = await asyncio.gather(*fetches)
+    if holidays is None:
+        return json_response({"Error": "Error getting holiday data from NagerDate"}, 500)
+    if forecast == [None]:
+        return json_response({"Error": "Error getting weather data from 7timer"}, 500)
+
+    return json_response(flask_app.event_response(
+        *found, holidays, forecast[0] if forecast else None))
+
+
+async def get_weather(request):
+    '''Get the weather of popular Australian cities'''
+    # A missing date is left to the Flask app's parser, which reports it
+    if 'date' not in request.query:
+        return await wsgi(request)
+    value = request.query['date']
+    error = flask_app.weather_date_error(value)
+    if error is not None:
+        return json_response({"Error": error}, 400)
+    date_diff = flask_app.days_until(value)
+
+    # Reuse the image another worker already rendered for this date
+    image_key = f"weather-image:{value}"
+    image = await aiosql.run(cache.get, image_key)
+    if image is not None:
+        return web.Response(body=image, content_type='image/png')
+
+    # Get the weather data for every location at once
+    popular_cities = flask_app.get_popular_cities()
+    forecasts = await asyncio.gather(
+        *(util.get_forecast_async(lat, lng) for _, lat, lng in popular_cities))
+    cities = []
+    for (city, lat, lng), data in zip(popular_cities, forecasts):
+        temperature = None if data is None else \
+            flask_app.forecast_temperature(data, value, date_diff)
+        if temperature is None:
+            return json_response({"Error": "Error retrieving weather data"}, 500)
+        cities.append((city, lat, lng, temperature))
+
+    try:
+        image = await render.render_async(render.draw_weather, cities)
+    except render.RenderBusy:
+        return render_busy()
+    await aiosql.run(cache.put, image_key, image, const.IMAGE_TTL)
+    return web.Response(body=image, content_type='image/png')
+
+
+# Pass a request to the Flask app as a WSGI call on a thread
+async def wsgi(request):
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': unquote(request.raw_path.split('?', 1)[0], encoding='latin-1'),
+        'QUERY_STRING': request.query_string,
+        'SERVER_NAME': request.url.host or 'localhost',
+        'SERVER_PORT': str(request.url.port or 80),
+        'SERVER_PROTOCOL': f'HTTP/{request.version.major}.{request.version.minor}',
+        'REMOTE_ADDR': request.remote or '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': BytesIO(await request.read()),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in request.headers.items():
+        key = name.upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f'HTTP_{key}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+
+    status, headers, body = await asyncio.get_running_loop().run_in_executor(
+        None, call_wsgi, environ)
+    code, reason = status.split(' ', 1)
+    # The length is set again from the body
+    headers = CIMultiDict((name, value) for name, value in headers
+                          if name.lower() != 'content-length')
+    return web.Response(status=int(code), reason=reason, headers=headers, body=body)
+
+
+def call_wsgi(environ):
+    response = []
+
+    def start_response(status, headers, exc_info=None):
+        response[:] = [status, headers]
+
+    result = flask_app.app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response[0], response[1], body
+
+
+# Start the render processes and background archiving as the other entry
+# points do, and load the location data before the first request
+async def start(application):
+    render.pool.start()
+    archive.start()
+    geo.get_places_by_name()
+    geo.get_forecast_index()
+    flask_app.get_popular_cities()
+
+
+async def close(application):
+    await async_nager_date.close()
+    await async_seven_timer.close()
+
+
+def create_app():
+    flask_app.init_app()
+    application = web.Application()
+    application.router.add_get(r'/events/{id:\d+}', get_event)
+    application.router.add_get('/weather', get_weather)
+    application.router.add_route('*', '/{path:.*}', wsgi)
+    application.on_startup.append(start)
+    application.on_cleanup.append(close)
+    return application
+
+
+if __name__ == '__main__':
+    diagnostics.handle_signal()
+    host, port = os.environ.get('BIND', '127.0.0.1:5000').rsplit(':', 1)
+    web.run_app(create_app(), host=host, port=int(port), backlog=const.ASYNC_BACKLOG)
@@ -0,0 +1,101 @@
+import os
+import random
+import tempfile
+import timeit
+from datetime import date, timedelta
+import util.constants as const
+import util.sql as sql
+import util.archive as archive
+import util.validation as validation
+from util.recurrence import expand_events, event_dates
+
+# Latency of queries about recent and upcoming dates with ten years of events
+# in the events table, compared with 90% of them moved to the archives. Run
+# from the project root with `python -m benchmarks.archive`
+
+EVENTS = 50000
+REPEAT = 20
+COLUMNS = "id,name,date,time_from,time_to,street,suburb,state,post_code"
+TODAY = date.today()
+CUTOFF = TODAY - timedelta(days=const.ARCHIVE_AFTER_DAYS)
+
+
+# Events spread over the nine years before the cutoff and, for one in ten,
+# the two years around today
+def create_db():
+    sql.init_db()
+    random_dates = random.Random(0)
+    with sql.transaction() as connection:
+        for i in range(EVENTS):
+            if i % 10:
+                day = CUTOFF - timedelta(days=random_dates.randint(1, 9 * 365))
+            else:
+                day = TODAY + timedelta(days=random_dates.randint(-365, 365))
+            minute = i % 720 * 2
+            connection.execute(
+                "INSERT INTO events VALUES(NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (f'Event {i}', str(day), f"{minute // 60:02}:{minute % 60:02}:00",
+                 f"{minute // 60:02}:{minute % 60 + 1:02}:00", '215B Night Av',
+                 'Kensington', 'NSW', '2033', 'Benchmark', '2030-01-01 00:00:00'))
+
+
+def list_month():
+    end = TODAY + timedelta(days=30)
+    return list(expand_events(COLUMNS, TODAY, end, archive.get_tables(TODAY, end)))
+
+
+def list_newest():
+    table = archive.get_list_table(10, True)
+    return sql.execute_query(
+        f"SELECT {COLUMNS} FROM {table} ORDER BY date DESC, time_from DESC LIMIT 10")
+
+
+def count_month():
+    start, end = TODAY.replace(day=1), TODAY.replace(day=28) + timedelta(days=4)
+    return sum(1 for _ in event_dates(start, end)) + \
+        sum(count for _, count in archive.get_archived_days(start, end))
+
+
+def count_per_day():
+    days = dict(archive.get_archived_days())
+    for day in event_dates():
+        days[str(day)] = days.get(str(day), 0) + 1
+    return days
+
+
+def neighbours():
+    event = sql.execute_query(
+        "SELECT * FROM events WHERE date >= ? ORDER BY date LIMIT 1", (str(TODAY),))[0]
+    return archive.get_previous(event), archive.get_next(event)
+
+
+QUERIES = {
+    'list next 30 days': list_month,
+    'list newest 10': list_newest,
+    'overlap check': lambda: validation.is_event_overlap(
+        (str(TODAY + timedelta(days=7)), '23:59:00', '23:58:00')),
+    'count this month': count_month,
+    'count per day': count_per_day,
+    'previous/next': neighbours,
+}
+
+
+def measure():
+    return {name: min(timeit.repeat(query, number=1, repeat=REPEAT)) * 1000
+            for name, query in QUERIES.items()}
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        const.DB_NAME = os.path.join(directory, 'database')
+        create_db()
+        results = {name: query() for name, query in QUERIES.items()}
+        before = measure()
+        archived = archive.archive_events()
+        assert {name: query() for name, query in QUERIES.items()} == results
+        after = measure()
+        hot = sql.execute_query("SELECT COUNT(*) FROM events")[0][0]
+        print(f"{EVENTS} events, {archived} archived, {hot} left in the events table\n")
+        print(f"  {'':20} {'one table':>12} {'archived':>12}")
+        for name in QUERIES:
+            print(f"  {name:20} {before[name]:9.2f} ms {after[name]:9.2f} ms")
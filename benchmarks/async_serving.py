@@ -0,0 +1,167 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from aiohttp import web, ClientSession, TCPConnector
+import util.constants as const
+import benchmarks.stub as upstream
+
+# Requests held at once by the threaded Flask server (`python app.py`) and the
+# async server (`python async_app.py`) when the external APIs take LATENCY
+# seconds to answer. Each server runs in its own process against a local stub
+# of Nager.Date and 7Timer, with caching turned off so that every request
+# waits on the stub. Run from the project root with
+# `python -m benchmarks.async_serving`
+
+LATENCY = 1
+EVENTS = 100
+CLIENTS = (100, 1000, 3000)
+MODES = ('threaded', 'async')
+SERVER_PORT = 5099
+
+
+# Stub upstream answering every request after LATENCY seconds, on an event
+# loop so that thousands of requests can wait on it at once
+async def stub(request):
+    await asyncio.sleep(LATENCY)
+    return web.json_response(upstream.respond(request.path))
+
+
+def start_stub():
+    loop = asyncio.new_event_loop()
+    application = web.Application()
+    application.router.add_get('/{path:.*}', stub)
+    runner = web.AppRunner(application, access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0, backlog=const.ASYNC_BACKLOG)
+    loop.run_until_complete(site.start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+def create_db():
+    import util.sql as sql
+    sql.init_db()
+    with sql.transaction() as connection:
+        for i in range(EVENTS):
+            connection.execute(
+                "INSERT INTO events VALUES(NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (f'Event {i}', f'2030-01-{i % 28 + 1:02}', f"{i % 24:02}:00:00",
+                 f"{i % 24:02}:59:00", '215B Night Av', 'Kensington', 'NSW',
+                 '2033', 'Benchmark', '2030-01-01 00:00:00'))
+
+
+# Run a server in this process, with the database and cache in directory
+def serve(mode, directory):
+    const.DB_NAME = os.path.join(directory, 'database')
+    const.CACHE_DB_NAME = os.path.join(directory, 'cache')
+    const.HOLIDAY_TTL = const.FORECAST_TTL = const.CACHE_STALE_TTL = 0
+    if mode == 'threaded':
+        from werkzeug.serving import BaseWSGIServer
+        from app import app, init_app
+        # Give both servers the same listen backlog
+        BaseWSGIServer.request_queue_size = const.ASYNC_BACKLOG
+        init_app()
+        app.run(port=SERVER_PORT, threaded=True)
+    else:
+        from aiohttp import web
+        from async_app import create_app
+        web.run_app(create_app(), host='127.0.0.1', port=SERVER_PORT,
+                    backlog=const.ASYNC_BACKLOG, access_log=None, print=None)
+
+
+def read_status(pid):
+    with open(f'/proc/{pid}/status') as status:
+        fields = dict(line.split(':', 1) for line in status)
+    return int(fields['Threads']), int(fields['VmRSS'].split()[0]) // 1024
+
+
+# Send clients requests at once. Returns the median and slowest latency in
+# seconds, the number of failed requests, and the most threads and memory
+# (MB) of the server while they were being served
+async def run(clients, pid):
+    url = f'http://127.0.0.1:{SERVER_PORT}/events/'
+    latencies, failures, peak = [], 0, [0, 0]
+    done = asyncio.Event()
+
+    async def sample():
+        while not done.is_set():
+            peak[:] = map(max, peak, read_status(pid))
+            await asyncio.sleep(0.05)
+
+    async def request(session, i):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            async with session.get(f'{url}{i % EVENTS + 1}') as response:
+                await response.read()
+                if response.status != 200:
+                    failures += 1
+                    return
+        except Exception:
+            failures += 1
+            return
+        latencies.append(time.perf_counter() - start)
+
+    sampler = asyncio.ensure_future(sample())
+    async with ClientSession(connector=TCPConnector(limit=0)) as session:
+        await asyncio.gather(*(request(session, i) for i in range(clients)))
+    done.set()
+    await sampler
+    latencies.sort()
+    if not latencies:
+        return None, None, failures, peak
+    return latencies[len(latencies) // 2], latencies[-1], failures, peak
+
+
+def wait_for_server(server):
+    import urllib.request
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError("The server exited")
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{SERVER_PORT}/events/changes')
+            return
+        except OSError:
+            time.sleep(0.2)
+
+
+def main():
+    url = start_stub()
+    env = dict(os.environ, NAGER_DATE_URL=url, SEVEN_TIMER_URL=url)
+    print(f"Upstream latency {LATENCY} s, every request waits on the upstream\n")
+    print(f"  {'clients':>7} {'mode':>9} {'p50':>8} {'max':>8} {'failed':>7}"
+          f" {'wall':>8} {'threads':>8} {'RSS':>7}")
+    for clients in CLIENTS:
+        for mode in MODES:
+            with tempfile.TemporaryDirectory() as directory:
+                const.DB_NAME = os.path.join(directory, 'database')
+                create_db()
+                server = subprocess.Popen(
+                    [sys.executable, '-m', 'benchmarks.async_serving', 'serve', mode,
+                     directory], env=env, stderr=subprocess.DEVNULL)
+                try:
+                    wait_for_server(server)
+                    start = time.perf_counter()
+                    p50, slowest, failures, (threads, rss) = asyncio.run(
+                        run(clients, server.pid))
+                    wall = time.perf_counter() - start
+                finally:
+                    # Interrupt rather than terminate, so that the server
+                    # stops its render processes
+                    server.send_signal(signal.SIGINT)
+                    server.wait()
+            latency = f"{p50:7.2f}s {slowest:7.2f}s" if p50 is not None else f"{'-':>8} {'-':>8}"
+            print(f"  {clients:>7} {mode:>9} {latency} {failures:>7}"
+                  f" {wall:7.2f}s {threads:>8} {rss:>5}MB")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['serve']:
+        serve(sys.argv[2], sys.argv[3])
+    else:
+        main()
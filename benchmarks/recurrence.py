@@ -0,0 +1,73 @@
+import os
+import tempfile
+import timeit
+from datetime import date, timedelta
+import util.constants as const
+import util.sql as sql
+import util.validation as validation
+from util.recurrence import Recurrence, expand_events, event_dates, save_recurrence
+
+# Table size and query cost of weekly meetings stored as recurring events,
+# compared with one row per meeting. Run from the project root with
+# `python -m benchmarks.recurrence`
+
+SERIES = 200
+WEEKS = 104
+REPEAT = 5
+START = date(2030, 1, 7)
+COLUMNS = "id,name,date,time_from,time_to,street,suburb,state,post_code"
+
+
+def create_db(name, recurring):
+    const.DB_NAME = name
+    sql.init_db()
+    with sql.transaction() as connection:
+        for i in range(SERIES):
+            # Each series gets its own 2 minute slot so nothing overlaps
+            minute = i * 2
+            time_from = f"{8 + minute // 60:02}:{minute % 60:02}:00"
+            time_to = f"{8 + minute // 60:02}:{minute % 60 + 1:02}:00"
+            dates = [START] if recurring else [START + timedelta(weeks=w) for w in range(WEEKS)]
+            for day in dates:
+                cursor = connection.execute(
+                    "INSERT INTO events VALUES(NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (f'Meeting {i}', str(day), time_from, time_to, '215B Night Av',
+                     'Kensington', 'NSW', '2033', 'Weekly meeting', '2030-01-01 00:00:00'))
+                if recurring:
+                    save_recurrence(cursor.lastrowid,
+                                    Recurrence(START, 'weekly', count=WEEKS), connection)
+    sql.execute_query("PRAGMA wal_checkpoint(TRUNCATE)")
+    size = os.path.getsize(f'{name}.db')
+    rows = sql.execute_query("SELECT COUNT(*) FROM events")[0][0]
+    return rows, size
+
+
+def best(func):
+    return min(timeit.repeat(func, number=1, repeat=REPEAT)) * 1000
+
+
+def measure(name):
+    const.DB_NAME = name
+    month_start, month_end = date(2030, 6, 1), date(2030, 6, 30)
+    return {
+        'overlap check': best(lambda: validation.is_event_overlap(
+            ('2030-06-03', '08:30:00', '08:00:00'))),
+        'list one month': best(lambda: list(expand_events(COLUMNS, month_start, month_end))),
+        'count one month': best(lambda: sum(1 for _ in event_dates(month_start, month_end))),
+        'count all': best(lambda: sum(1 for _ in event_dates())),
+    }
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        materialized = os.path.join(directory, 'materialized')
+        recurring = os.path.join(directory, 'recurring')
+        print(f"{SERIES} weekly meetings over {WEEKS} weeks\n")
+        for label, name, is_recurring in (('materialized', materialized, False),
+                                          ('recurring', recurring, True)):
+            rows, size = create_db(name, is_recurring)
+            print(f"  {label:<14} {rows:6} rows  {size / 1024:8.0f} KiB")
+        results = measure(materialized), measure(recurring)
+        print(f"\n  {'query':<16} {'materialized':>14} {'recurring':>12}")
+        for query in results[0]:
+            print(f"  {query:<16} {results[0][query]:11.2f} ms {results[1][query]:9.2f} ms")
@@ -0,0 +1,66 @@
+import gzip
+import json
+import timeit
+import util.constants as const
+import util.output as output
+
+# Serialization cost of a GET /events page with every filter field, comparing
+# the per-row loop that re-splits the filter with the precompiled projection.
+# Run from the project root with `python -m benchmarks.serialization`
+
+FILTER = 'id,name,date,time_from,time_to,street,suburb,state,post_code'
+REPEAT = 5
+
+
+def make_rows(n):
+    return [(i, f'Event {i}', '2030-01-01', '10:00:00', '11:00:00',
+             '215B Night Av', 'Kensington', 'NSW', '2033') for i in range(n)]
+
+
+def loop_events(rows):
+    events = []
+    for row in rows:
+        event = {}
+        for i, field in enumerate(FILTER.split(',')):
+            if field == 'time_from':
+                event['time'] = row[i]
+            elif field == 'time_to':
+                event['to'] = row[i]
+            elif field in {'street', 'suburb', 'state', 'post_code'}:
+                event.setdefault('location', {})[field.replace('_', '-')] = row[i]
+            else:
+                event[field] = row[i]
+        events.append(event)
+    return events
+
+
+def projected_events(rows):
+    project = output.compile_projection(FILTER.split(','))
+    return [project(row) for row in rows]
+
+
+def best(func):
+    return min(timeit.repeat(func, number=1, repeat=REPEAT)) * 1000
+
+
+if __name__ == '__main__':
+    print(f"orjson {'available' if output.orjson else 'not installed'}, "
+          f"brotli {'available' if output.brotli else 'not installed'}")
+    for n in (1000, 10000):
+        rows = make_rows(n)
+        events = projected_events(rows)
+        assert events == loop_events(rows)
+        body = output.dumps({'events': events})
+        if isinstance(body, str):
+            body = body.encode()
+        print(f"\n{n} rows")
+        print(f"  per-row loop        {best(lambda: loop_events(rows)):8.2f} ms")
+        print(f"  projection          {best(lambda: projected_events(rows)):8.2f} ms")
+        print(f"  json.dumps          {best(lambda: json.dumps({'events': events})):8.2f} ms")
+        print(f"  output.dumps        {best(lambda: output.dumps({'events': events})):8.2f} ms")
+        print(f"  gzip                {best(lambda: gzip.compress(body, const.GZIP_LEVEL)):8.2f} ms"
+              f"  {len(body)} -> {len(gzip.compress(body, const.GZIP_LEVEL))} bytes")
+        if output.brotli:
+            compressed = output.brotli.compress(body, quality=const.BROTLI_QUALITY)
+            print(f"  brotli              {best(lambda: output.brotli.compress(body, quality=const.BROTLI_QUALITY)):8.2f} ms"
+                  f"  {len(body)} -> {len(compressed)} bytes")
@@ -0,0 +1,120 @@
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+from datetime import date, timedelta
+import util.constants as const
+import util.diagnostics as diagnostics
+import benchmarks.stub as stub
+
+# Soak test of every endpoint: each is requested WARMUP times so that caches
+# and lazily loaded data are filled, and then ROUNDS times, after which the
+# memory traced by tracemalloc may not have grown by more than MAX_GROWTH.
+# The external APIs are a local stub and caching of their data is turned off,
+# so every request goes through the whole upstream path. Run from the project
+# root with `python -m benchmarks.soak`
+
+EVENTS = 200
+WARMUP = 20
+ROUNDS = 200
+MAX_GROWTH = 256 * 1024
+DAY = date.today() + timedelta(days=2)
+
+
+def event(i, day, hour):
+    return {
+        'name': f'Soak {i}',
+        'date': str(day),
+        'from': f'{hour:02}:00:00',
+        'to': f'{hour:02}:30:00',
+        'location': {'street': '215B Night Av', 'suburb': 'Kensington',
+                     'state': 'NSW', 'post-code': '2033'},
+        'description': 'Soak test',
+    }
+
+
+def write_cycle(client, i):
+    response = client.post('/events', json=event(i, DAY, 23))
+    id = response.get_json()['id']
+    client.patch(f'/events/{id}', json={'name': f'Renamed {i}'})
+    return client.delete(f'/events/{id}')
+
+
+ENDPOINTS = {
+    'POST/PATCH/DELETE /events': write_cycle,
+    'GET /events': lambda client, i: client.get(f'/events?page={i % 10 + 1}&size=20'),
+    'GET /events window': lambda client, i: client.get(
+        f'/events?start={DAY}&end={DAY + timedelta(days=30)}&size=20'),
+    'GET /events/<id>': lambda client, i: client.get(f'/events/{i % EVENTS + 1}'),
+    'GET /events/changes': lambda client, i: client.get('/events/changes?since=0&size=100'),
+    'GET /events/statistics json': lambda client, i: client.get(
+        '/events/statistics?format=json'),
+    'GET /events/statistics image': lambda client, i: client.get(
+        '/events/statistics?format=image'),
+    'GET /weather': lambda client, i: client.get(f'/weather?date={date.today()}'),
+}
+
+
+# Events from DAY onwards, 22 a day, leaving 23:00 free for the write cycles
+def create_db(client):
+    for i in range(EVENTS):
+        response = client.post('/events', json=event(i, DAY + timedelta(days=i // 22), i % 22))
+        assert response.status_code == 201, response.data
+
+
+def traced():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def soak(client, name, request):
+    for i in range(WARMUP):
+        response = request(client, i)
+        assert response.status_code == 200, (name, response.status_code, response.data)
+    # The snapshot is traced too, so it is taken before measuring
+    snapshot = diagnostics.take_snapshot()
+    before, rss = traced(), diagnostics.get_rss()
+    for i in range(WARMUP, WARMUP + ROUNDS):
+        response = request(client, i)
+        assert response.status_code == 200, (name, response.status_code, response.data)
+    growth = traced() - before
+    rss_growth = diagnostics.get_rss() - rss if rss is not None else 0
+    passed = growth <= MAX_GROWTH
+    print(f"  {'PASS' if passed else 'FAIL'}  {name:<30} traced {growth / 1024:+9.1f} KB"
+          f"   RSS {rss_growth / 1024:+9.1f} KB")
+    if not passed:
+        for stat in diagnostics.take_snapshot().compare_to(snapshot, 'lineno')[:5]:
+            print(f"        {stat}")
+    return passed
+
+
+def main():
+    import app
+    app.init_app()
+    client = app.app.test_client()
+    create_db(client)
+    print(f"{ROUNDS} rounds per endpoint after {WARMUP} to warm up, "
+          f"growth allowed {MAX_GROWTH // 1024} KB\n")
+    results = [soak(client, name, request) for name, request in ENDPOINTS.items()]
+    report = diagnostics.report()
+    print("\nPeak allocation per request")
+    for endpoint, stats in report['requests'].items():
+        print(f"  {endpoint:<36} mean {stats['peak-mean'] / 1024:9.1f} KB"
+              f"   max {stats['peak-max'] / 1024:9.1f} KB")
+    return all(results)
+
+
+if __name__ == '__main__':
+    url = stub.start_stub()
+    with tempfile.TemporaryDirectory() as directory:
+        const.DB_NAME = os.path.join(directory, 'database')
+        const.CACHE_DB_NAME = os.path.join(directory, 'cache')
+        const.NAGER_DATE_URL = const.SEVEN_TIMER_URL = url
+        const.HOLIDAY_TTL = const.FORECAST_TTL = const.IMAGE_TTL = 0
+        const.CACHE_STALE_TTL = 0
+        const.ARCHIVE_INTERVAL = 0
+        const.MEMORY_DIAGNOSTICS = True
+        diagnostics.start()
+        passed = main()
+    sys.exit(0 if passed else 1)
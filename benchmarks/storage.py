@@ -0,0 +1,76 @@
+import importlib
+import os
+import tempfile
+import threading
+import time
+import util.constants as const
+import util.sql as sql
+
+# Request latency of the read endpoints with the database file compared with
+# the in-memory database, at 1 and 8 concurrent clients. Run from the project
+# root with `python -m benchmarks.storage`
+
+EVENTS = 5000
+REQUESTS = 400
+CLIENTS = (1, 8)
+ENDPOINTS = (
+    '/events?page=20&size=50&filter=id,name,date,from,to,location',
+    '/events?order=-datetime,%2Bname&size=20',
+    '/events?start=2030-03-01&end=2030-03-31&size=50&filter=id,name,date',
+    '/events/statistics?format=json',
+)
+
+
+def create_db():
+    sql.init_db()
+    with sql.transaction() as connection:
+        for i in range(EVENTS):
+            day = f"2030-{i // 28 % 12 + 1:02}-{i % 28 + 1:02}"
+            hour = i // 336 % 24
+            connection.execute(
+                "INSERT INTO events VALUES(NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (f'Event {i}', day, f"{hour:02}:00:00", f"{hour:02}:59:00",
+                 '215B Night Av', 'Kensington', 'NSW', '2033', 'Benchmark',
+                 '2030-01-01 00:00:00'))
+
+
+# Median and 99th percentile latency in ms of REQUESTS requests to path
+def run(app, path, clients):
+    latencies = []
+
+    def client():
+        test_client = app.test_client()
+        for _ in range(REQUESTS // clients):
+            start = time.perf_counter()
+            response = test_client.get(path)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.data
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return (latencies[len(latencies) // 2] * 1000,
+            latencies[len(latencies) * 99 // 100] * 1000)
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        const.DB_NAME = os.path.join(directory, 'database')
+        const.CACHE_DB_NAME = os.path.join(directory, 'cache')
+        create_db()
+        app = importlib.import_module('app').app
+        print(f"{EVENTS} events, {REQUESTS} requests per endpoint, "
+              f"latency p50 / p99 in ms")
+        for path in ENDPOINTS:
+            print(f"\n{path}")
+            for clients in CLIENTS:
+                results = []
+                for mode in ('file', 'memory'):
+                    const.DB_MODE = mode
+                    results.append(run(app, path, clients))
+                print(f"  {clients} clients  file {results[0][0]:6.2f} / {results[0][1]:6.2f}"
+                      f"   memory {results[1][0]:6.2f} / {results[1][1]:6.2f}")
+        sql.snapshot()
@@ -0,0 +1,48 @@
+import datetime
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stub of Nager.Date and 7Timer for the benchmarks, built on the
+# standard library so that it runs without the async server's dependencies.
+# Every path under /api/v2/publicholidays answers with holidays, and any
+# other path with a forecast
+
+
+def holidays():
+    return [{'date': '2030-01-01', 'name': "New Year's Day"}]
+
+
+# Forecast starting today, as 7Timer answers for any location
+def forecast():
+    init = datetime.datetime.utcnow().strftime('%Y%m%d00')
+    return {'init': init, 'dataseries': [
+        {'timepoint': 3 * i, 'cloudcover': 2, 'prec_type': 'none', 'prec_amount': 0,
+         'wind10m': {'speed': 2}, 'weather': 'clearday', 'rh2m': '50%', 'temp2m': 20}
+        for i in range(1, 65)]}
+
+
+def respond(path):
+    return holidays() if path.startswith('/api/v2/publicholidays') else forecast()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        body = json.dumps(respond(self.path)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# Serve the stub on a free port in the background. Returns its URL
+def start_stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import threading
+import time
+import util.constants as const
+import util.sql as sql
+import util.validation as validation
+from util.writer import BatchWriter
+
+# Writes per second of event creation at 1, 8 and 64 concurrent clients,
+# committing each write on its own compared with group commit through the
+# batch writer. Run from the project root with `python -m benchmarks.writes`
+
+CLIENTS = (1, 8, 64)
+WRITES = 2000
+
+
+# The same overlap check and insert as POST /events, with every write in a
+# free slot so that all of them succeed
+def create(i):
+    day = f"2030-{i // 1440 % 12 + 1:02}-{i // 60 % 24 + 1:02}"
+    time_from = f"{i % 20:02}:{i // 20 % 3 * 20:02}:00"
+    time_to = f"{i % 20:02}:{i // 20 % 3 * 20 + 19:02}:00"
+
+    def operation(connection):
+        if validation.is_event_overlap((day, time_to, time_from),
+                                       connection=connection):
+            return None
+        return connection.execute(
+            "INSERT INTO events VALUES(NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ('Event', day, time_from, time_to, '215B Night Av', 'Kensington',
+             'NSW', '2033', 'Benchmark', '2030-01-01 00:00:00')).lastrowid
+    return operation
+
+
+def single(operation):
+    with sql.transaction() as connection:
+        return operation(connection)
+
+
+def run(clients, submit):
+    sql.execute_query("DELETE FROM events")
+    counter = iter(range(WRITES))
+    lock = threading.Lock()
+    results = []
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            results.append(submit(create(i)))
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    assert None not in results and len(set(results)) == WRITES
+    return WRITES / elapsed
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        const.DB_NAME = os.path.join(directory, 'database')
+        sql.init_db()
+        writer = BatchWriter()
+        print(f"{WRITES} writes, batch window {writer.window * 1000:g} ms, "
+              f"batch size {writer.size}\n")
+        print(f"  {'clients':>7} {'per-write commit':>18} {'group commit':>14}")
+        for clients in CLIENTS:
+            print(f"  {clients:7} {run(clients, single):12.0f} w/s "
+                  f"{run(clients, writer.submit):8.0f} w/s")
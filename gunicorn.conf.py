@@ -0,0 +1,37 @@
+import multiprocessing
+import os
+
+# Serve the API with one pre-forked worker process per core. Workers share the
+# database and the external data cache through SQLite files, so any number of
+# them can run side by side on one machine
+wsgi_app = 'wsgi:application'
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WORKERS', multiprocessing.cpu_count()))
+# An in-memory database belongs to one process, so memory mode runs a single
+# worker and scales with threads instead
+if os.environ.get('DB_MODE') == 'memory':
+    workers = 1
+threads = int(os.environ.get('THREADS', 4))
+preload_app = True
+
+
+# Start each worker's render processes before it takes requests, and its
+# background archiving of past events
+def post_fork(server, worker):
+    import util.render as render
+    import util.archive as archive
+    render.pool.start()
+    archive.start()
+
+
+# Let SIGUSR2 write a memory report of the worker, once the worker has set up
+# its own signal handlers
+def post_worker_init(worker):
+    import util.diagnostics as diagnostics
+    diagnostics.handle_signal()
+
+
+# Copy an in-memory database to the database file before the worker exits
+def worker_exit(server, worker):
+    import util.sql as sql
+    sql.snapshot()
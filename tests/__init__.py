@@ -0,0 +1,11 @@
+import os
+import tempfile
+import util.constants as const
+import app
+
+# The tests share a database in a temporary directory
+
+directory = tempfile.TemporaryDirectory()
+const.DB_NAME = os.path.join(directory.name, 'database')
+const.CACHE_DB_NAME = os.path.join(directory.name, 'cache')
+app.init_app()
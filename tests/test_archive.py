@@ -0,0 +1,69 @@
+import unittest
+from datetime import date
+from util.sql import execute_query
+import util.archive as archive
+import app
+
+# Changes to archived events. Run from the project root with
+# `python -m unittest`
+
+
+def event(name, day, hour):
+    return {
+        'name': name,
+        'date': day,
+        'from': f'{hour:02}:00:00',
+        'to': f'{hour:02}:30:00',
+        'location': {'street': '215B Night Av', 'suburb': 'Kensington',
+                     'state': 'NSW', 'post-code': '2033'},
+        'description': 'Archive test',
+    }
+
+
+class ArchivedEventTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def create(self, data):
+        response = self.client.post('/events', json=data)
+        self.assertEqual(response.status_code, 201)
+        return response.get_json()['id']
+
+    def is_archived(self, id):
+        return (archive.find_event(id) is not None
+                and not execute_query("SELECT 1 FROM events WHERE id = ?", (id,)))
+
+    def test_rejected_patch_stays_archived(self):
+        id = self.create(event('Archived', '2001-03-01', 9))
+        self.create(event('Other', '2001-03-01', 10))
+        archive.archive_events(date.today())
+        self.assertTrue(self.is_archived(id))
+
+        response = self.client.patch(f'/events/{id}', json={'from': '10:00:00', 'to': '10:30:00'})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(self.is_archived(id))
+        response = self.client.patch(f'/events/{id}', json={'unknown': 'field'})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(self.is_archived(id))
+
+        response = self.client.patch(f'/events/{id}', json={'name': 'Renamed'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(execute_query("SELECT name FROM events WHERE id = ?", (id,)),
+                         [('Renamed',)])
+
+    def test_delete_archived(self):
+        id = self.create(event('Deleted', '2001-04-01', 9))
+        archive.archive_events(date.today())
+        self.assertTrue(self.is_archived(id))
+        self.assertEqual(self.client.delete(f'/events/{id}').status_code, 200)
+        self.assertIsNone(archive.find_event(id))
+        self.assertEqual(self.client.delete(f'/events/{id}').status_code, 404)
+
+    def test_deleted_newest_id_not_reused(self):
+        id = self.create(event('Newest', '2040-01-01', 9))
+        self.assertEqual(self.client.delete(f'/events/{id}').status_code, 200)
+        self.assertGreater(self.create(event('Next', '2040-01-01', 9)), id)
+        changes = self.client.get('/events/changes?since=0&size=1000').get_json()
+        self.assertIn((id, 'deleted'), [(change['id'], change['change'])
+                                        for change in changes['changes']])
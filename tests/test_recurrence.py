@@ -0,0 +1,167 @@
+import unittest
+from datetime import date
+from unittest.mock import patch
+from util.recurrence import Recurrence, get_horizon
+import app
+
+# Bounds of recurrence rules, and requests whose rules run up to the end of
+# the calendar. Run from the project root with `python -m unittest`
+
+
+def event(name, day, recurrence=None, hour=9):
+    data = {
+        'name': name,
+        'date': day,
+        'from': f'{hour:02}:00:00',
+        'to': f'{hour:02}:30:00',
+        'location': {'street': '215B Night Av', 'suburb': 'Kensington',
+                     'state': 'NSW', 'post-code': '2033'},
+        'description': 'Recurrence test',
+    }
+    if recurrence is not None:
+        data['recurrence'] = recurrence
+    return data
+
+
+class RecurrenceTest(unittest.TestCase):
+
+    def test_count_past_max_date(self):
+        series = Recurrence(date(2030, 1, 1), 'daily', count=10 ** 9)
+        self.assertEqual(series.last(), date.max)
+
+    def test_monthly_count_past_max_date(self):
+        series = Recurrence(date(2030, 1, 31), 'monthly', interval=100, count=1000)
+        self.assertEqual(series.last(), date.max)
+
+    def test_occurrences_until_max_date(self):
+        series = Recurrence(date(9999, 12, 1), 'weekly', until=date.max)
+        self.assertEqual(list(series.occurrences())[-1], date(9999, 12, 29))
+
+    def test_horizon_near_max_date(self):
+        self.assertEqual(get_horizon(date(9999, 12, 1)), date.max)
+
+    def test_shared_date_far_ahead(self):
+        weekly = Recurrence(date(2030, 1, 7), 'weekly', interval=3)
+        daily = Recurrence(date(2030, 1, 8), 'daily', interval=5,
+                           exceptions=[date(2030, 1, 28)])
+        self.assertTrue(weekly.shares_date(daily, date(2030, 1, 10)))
+        every_other = Recurrence(date(2030, 1, 14), 'weekly', interval=2)
+        self.assertFalse(Recurrence(date(2030, 1, 7), 'weekly', interval=2).shares_date(
+            every_other, date.max))
+
+    def test_shared_date_of_monthly_and_weekly(self):
+        monthly = Recurrence(date(2030, 1, 31), 'monthly', count=3)
+        weekly = Recurrence(date(2030, 1, 3), 'weekly')
+        # Thursday 2030-01-31 is the first occurrence of both
+        self.assertTrue(monthly.shares_date(weekly, date(2030, 1, 10)))
+        self.assertFalse(monthly.shares_date(
+            Recurrence(date(2030, 1, 4), 'weekly', count=4), date.max))
+
+
+class RecurrenceRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def post(self, data):
+        return self.client.post('/events', json=data)
+
+    def test_count_too_large(self):
+        response = self.post(event('Count', '2031-01-01', {'freq': 'daily', 'count': 10 ** 9}))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('count', response.get_json()['Errors'])
+
+    def test_interval_too_large(self):
+        response = self.post(event('Interval', '2031-01-01', {
+            'freq': 'monthly', 'interval': 1000000, 'count': 2}))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('interval', response.get_json()['Errors'])
+
+    def test_until_before_date(self):
+        response = self.post(event('Until', '2031-01-10', {
+            'freq': 'daily', 'until': '2031-01-01'}))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('until', response.get_json()['Errors'])
+
+    def test_patch_date_after_until(self):
+        response = self.post(event('Moved', '2032-01-01', {
+            'freq': 'daily', 'until': '2032-01-10'}, hour=10))
+        self.assertEqual(response.status_code, 201)
+        id = response.get_json()['id']
+        response = self.client.patch(f'/events/{id}', json={'date': '2032-02-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('until', response.get_json()['Errors'])
+
+    def test_until_max_date(self):
+        response = self.post(event('Forever', '2033-01-03', {
+            'freq': 'weekly', 'until': '9999-12-31'}, hour=23))
+        self.assertEqual(response.status_code, 201)
+        response = self.post(event('Forever too', '2033-01-05', {
+            'freq': 'weekly', 'until': '9999-12-31'}, hour=23))
+        self.assertEqual(response.status_code, 201)
+        response = self.post(event('Overlap', '2033-01-10', {
+            'freq': 'daily', 'count': 5}, hour=23))
+        self.assertEqual(response.status_code, 400)
+
+    def test_bounded_monthly_series_far_ahead(self):
+        # Both series occur on 2032-02-15, more than a year after they start
+        response = self.post(event('Every 25 months', '2030-01-15', {
+            'freq': 'monthly', 'interval': 25, 'count': 5}, hour=6))
+        self.assertEqual(response.status_code, 201)
+        response = self.post(event('Every 24 months', '2030-02-15', {
+            'freq': 'monthly', 'interval': 24, 'count': 5}, hour=6))
+        self.assertEqual(response.status_code, 400)
+
+    def test_long_series_against_many_series(self):
+        # Bi-weekly series on the Mondays and Tuesdays of even weeks, all
+        # within the hours of a long series on the Mondays of odd weeks
+        for i in range(20):
+            response = self.post(event(f'Bi-weekly {i}', f'2034-01-0{2 + i // 10}', {
+                'freq': 'weekly', 'interval': 2}, hour=8 + i % 10))
+            self.assertEqual(response.status_code, 201)
+        data = event('Long', '2034-01-09', {
+            'freq': 'weekly', 'interval': 2, 'until': '9000-12-31'}, hour=8)
+        data['to'] = '18:00:00'
+        # The series are solved for shared dates rather than walked to 9000
+        with patch.object(Recurrence, '_nth', autospec=True,
+                          side_effect=Recurrence._nth) as nth, \
+                patch.object(Recurrence, 'occurs_on', autospec=True,
+                             side_effect=Recurrence.occurs_on) as occurs_on:
+            response = self.post(data)
+        self.assertEqual(response.status_code, 201)
+        self.assertLess(nth.call_count + occurs_on.call_count, 100)
+
+
+class WindowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def test_window_too_long(self):
+        response = self.client.get('/events?start=2000-01-01&end=9999-12-31&size=1')
+        self.assertEqual(response.status_code, 400)
+
+    def test_window_page_order(self):
+        response = self.client.post('/events', json=event('Window', '2035-03-01', {
+            'freq': 'daily', 'count': 30}, hour=7))
+        self.assertEqual(response.status_code, 201)
+        query = '/events?start=2035-03-01&end=2035-03-31&order=-datetime,%2Bid&filter=id,date,from'
+        events = self.client.get(f'{query}&size=1000').get_json()['events']
+        self.assertEqual(events, sorted(sorted(events, key=lambda e: e['id']),
+                                        key=lambda e: (e['date'], e['time']), reverse=True))
+        pages = []
+        for page in range(1, len(events) // 12 + 2):
+            response = self.client.get(f'{query}&size=12&page={page}')
+            self.assertEqual(response.status_code, 200)
+            pages += response.get_json()['events']
+        self.assertEqual(pages, events)
+
+    def test_statistics_of_old_series(self):
+        response = self.client.post('/events', json=event('Old', '0001-01-01', {
+            'freq': 'daily'}, hour=5))
+        self.assertEqual(response.status_code, 201)
+        with patch.object(Recurrence, '_nth', autospec=True,
+                          side_effect=Recurrence._nth) as nth:
+            response = self.client.get('/events/statistics?format=json')
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(nth.call_count, 50000)
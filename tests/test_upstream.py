@@ -0,0 +1,170 @@
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import util.constants as const
+import util.cache as cache
+from util.upstream import Provider, UpstreamError
+
+# Fault injection for the upstream clients against a local stub server that
+# can hang, answer with 5xx errors, or send its body slowly or a byte at a
+# time. Run from the project root with `python -m unittest`
+
+TIMEOUT = 0.5
+BODY = b'{"dataseries": [' + b','.join([b'{"temp2m": 20}'] * 200) + b']}'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == '/hang':
+            time.sleep(TIMEOUT * 10)
+            return
+        if self.path == '/error':
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        if self.path == '/trickle':
+            # A byte at a time, never filling a chunk before the deadline
+            try:
+                for i in range(len(BODY)):
+                    self.wfile.write(BODY[i:i + 1])
+                    self.wfile.flush()
+                    time.sleep(TIMEOUT / 5)
+            except ConnectionError:
+                pass
+        elif self.path == '/slow':
+            # Each write arrives well within the read timeout, but the whole
+            # body takes far longer than the provider's time budget
+            try:
+                for i in range(0, len(BODY), 64):
+                    self.wfile.write(BODY[i:i + 64])
+                    self.wfile.flush()
+                    time.sleep(TIMEOUT / 10)
+            except ConnectionError:
+                # The client gave up on the body
+                pass
+        else:
+            self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+server = None
+url = None
+
+
+def setUpModule():
+    global server, url
+    cache.init_cache()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}'
+
+
+def tearDownModule():
+    server.shutdown()
+    server.server_close()
+
+
+def timed(func):
+    start = time.perf_counter()
+    try:
+        result = func()
+    except UpstreamError as error:
+        result = error
+    return result, time.perf_counter() - start
+
+
+class ProviderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.provider = Provider('stub', TIMEOUT)
+
+    def test_healthy_response(self):
+        data, _ = timed(lambda: self.provider.get_json(f'{url}/ok'))
+        self.assertIsInstance(data, dict)
+
+    def test_hang_cut_off_by_timeout(self):
+        error, elapsed = timed(lambda: self.provider.get_json(f'{url}/hang'))
+        self.assertIsInstance(error, UpstreamError)
+        self.assertLess(elapsed, TIMEOUT * 3)
+
+    def test_slow_body_cut_off_by_deadline(self):
+        error, elapsed = timed(lambda: self.provider.get_json(f'{url}/slow'))
+        self.assertIsInstance(error, UpstreamError)
+        self.assertLess(elapsed, TIMEOUT * 3)
+
+    def test_trickling_body_cut_off_by_deadline(self):
+        error, elapsed = timed(lambda: self.provider.get_json(f'{url}/trickle'))
+        self.assertIsInstance(error, UpstreamError)
+        self.assertIn('timed out', str(error))
+        self.assertLess(elapsed, TIMEOUT * 3)
+
+
+class CircuitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.provider = Provider('stub', TIMEOUT)
+        for _ in range(const.BREAKER_MIN_CALLS):
+            timed(lambda: self.provider.get_json(f'{url}/error'))
+
+    def test_opens_after_repeated_5xx(self):
+        self.assertTrue(self.provider.breaker.is_open())
+        error, elapsed = timed(lambda: self.provider.get_json(f'{url}/ok'))
+        self.assertIsInstance(error, UpstreamError)
+        self.assertLess(elapsed, TIMEOUT)
+
+    def test_late_success_leaves_circuit_open(self):
+        # A request that started before the circuit opened succeeds late
+        self.provider.breaker.record(True)
+        self.assertTrue(self.provider.breaker.is_open())
+        self.assertEqual(self.provider.breaker.allow(), (False, False))
+
+    def test_one_trial_after_cooldown(self):
+        breaker = self.provider.breaker
+        breaker.opened -= breaker.cooldown
+        self.assertEqual(breaker.allow(), (True, True))
+        self.assertEqual(breaker.allow(), (False, False))
+
+    def test_failed_trial_reopens_circuit(self):
+        self.provider.breaker.cooldown = 0
+        error, _ = timed(lambda: self.provider.get_json(f'{url}/error'))
+        self.assertIsInstance(error, UpstreamError)
+        self.assertTrue(self.provider.breaker.is_open())
+
+    def test_good_trial_closes_circuit(self):
+        self.provider.breaker.cooldown = 0
+        data, _ = timed(lambda: self.provider.get_json(f'{url}/ok'))
+        self.assertIsInstance(data, dict)
+        self.assertFalse(self.provider.breaker.is_open())
+
+
+class StaleCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.provider = Provider('stub', TIMEOUT)
+
+    def test_stale_value_served_during_hang(self):
+        cache.put('stub', {'stale': True}, -1)
+        data, elapsed = timed(lambda: cache.cached(
+            'stub', 60, lambda: self.provider.get_json(f'{url}/hang')))
+        self.assertEqual(data, {'stale': True})
+        self.assertLess(elapsed, TIMEOUT)
+
+    def test_stale_value_refreshed_in_background(self):
+        cache.put('stub-refresh', {'stale': True}, -1)
+        data = cache.cached('stub-refresh', 60, lambda: self.provider.get_json(f'{url}/ok'))
+        self.assertEqual(data, {'stale': True})
+        deadline = time.monotonic() + TIMEOUT * 3
+        while 'dataseries' not in (cache.get('stub-refresh') or {}) \
+                and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIn('dataseries', cache.get('stub-refresh') or {})
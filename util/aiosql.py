@@ -0,0 +1,17 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import util.constants as const
+
+# Database access for the async server. SQLite calls block, so they run on a
+# small pool of threads while the event loop carries on with other requests.
+# Any function of util.sql, or one taking its connections, can be run here
+
+
+executor = ThreadPoolExecutor(const.ASYNC_DB_THREADS, thread_name_prefix='db')
+
+
+# Run function(*args) on a database thread and return its result
+async def run(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, partial(function, *args))
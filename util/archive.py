@@ -0,0 +1,253 @@
+import os
+import threading
+import time
+from datetime import date, timedelta
+from functools import partial
+import util.constants as const
+from util.sql import execute_query, iterate_query, init_db
+from util.writer import execute_write
+from util.recurrence import RECURRENCE_COLUMNS, Recurrence, get_recurrence, \
+    parse_date, MIN_DATE, MAX_DATE
+
+# Hot/cold partitioning of events. Events that ended more than
+# ARCHIVE_AFTER_DAYS ago are moved in small batches from the events table to
+# an archive table for the year they start in (events_2021, ...), so queries
+# about recent and upcoming dates only read the events table. The archives
+# table lists each archive with the last date its events occur on and its
+# number of events, and archive_days counts the archived events and
+# occurrences of each day, so statistics never read the archives
+
+EVENT_COLUMNS = "e.id, e.name, e.date, e.time_from, e.time_to, e.street,\
+    e.suburb, e.state, e.post_code, e.description, e.last_update"
+
+PREVIOUS_QUERY = "SELECT * FROM {table} WHERE date < ? OR (date = ? AND time_to < ?)\
+    ORDER BY date DESC, time_to DESC LIMIT 1"
+NEXT_QUERY = "SELECT * FROM {table} WHERE date > ? OR (date = ? AND time_from > ?)\
+    ORDER BY date ASC, time_from ASC LIMIT 1"
+
+
+def table_name(year):
+    return f"events_{int(year)}"
+
+
+# Archives as (year, last date, number of events), oldest first
+def get_archives(connection=None):
+    return execute_query(
+        "SELECT year, last_date, events FROM archives ORDER BY year", (), connection)
+
+
+# Tables holding the events that may occur between start and end: the events
+# table, and the archives of the years up to the end with events occurring on
+# or after the start
+def get_tables(start=None, end=None, connection=None):
+    return ['events'] + [
+        table_name(year) for year, last_date, _ in get_archives(connection)
+        if (start is None or str(start) <= last_date)
+        and (end is None or year <= end.year)]
+
+
+# Table of every event to list ordered newest first or not. The archives are
+# only included when the first rows of the list aren't all in the events
+# table, newer than every archived event
+def get_list_table(rows, newest_first, connection=None):
+    archives = get_archives(connection)
+    if not archives:
+        return 'events'
+    if newest_first:
+        last_date = max(archive[1] for archive in archives)
+        newer = execute_query(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM events WHERE date > ? LIMIT ?)",
+            (last_date, rows), connection)[0][0]
+        if newer >= rows:
+            return 'events'
+    tables = ['events'] + [table_name(year) for year, _, _ in archives]
+    return "(" + " UNION ALL ".join(f"SELECT * FROM {table}" for table in tables) + ")"
+
+
+def get_total_archived(connection=None):
+    return execute_query(
+        "SELECT COALESCE(SUM(events), 0) FROM archives", (), connection)[0][0]
+
+
+# Generate the number of archived events and occurrences on each day between
+# start and end
+def get_archived_days(start=None, end=None, connection=None):
+    return iterate_query(
+        "SELECT day, events FROM archive_days WHERE day >= ? AND day <= ? ORDER BY day",
+        (str(start) if start else MIN_DATE, str(end) if end else MAX_DATE),
+        connection)
+
+
+# Find an archived event, returning its table and row, or None
+def find_event(id, connection=None):
+    for year, _, _ in reversed(get_archives(connection)):
+        row = execute_query(f"SELECT * FROM {table_name(year)} WHERE id = ?",
+                            (id,), connection)
+        if row:
+            return table_name(year), row[0]
+    return None
+
+
+# Id for a new event, after every id in the events table and the archives, so
+# an archived event and a new event never share an id. Ids of deleted events
+# are kept in the change feed, so they are never given out again either
+def next_id(connection=None):
+    tables = ['events'] + [table_name(year) for year, _, _ in get_archives(connection)]
+    ids = " UNION ALL ".join(
+        ["SELECT MAX(event_id) AS id FROM changes"]
+        + [f"SELECT MAX(id) AS id FROM {table}" for table in tables])
+    return execute_query(f"SELECT COALESCE(MAX(id), 0) + 1 FROM ({ids})",
+                         (), connection)[0][0]
+
+
+# Event before an event. The archives are searched from the year of the event
+# backwards, only when the events table has no previous event newer than
+# every archived event
+def get_previous(event, connection=None):
+    params = (event[2], event[2], event[3])
+    previous = execute_query(PREVIOUS_QUERY.format(table='events'), params, connection)
+    previous = previous[0] if previous else None
+    archives = get_archives(connection)
+    if not archives or (previous and previous[2] > max(a[1] for a in archives)):
+        return previous
+    for year, _, _ in reversed(archives):
+        if year > int(event[2][:4]):
+            continue
+        row = execute_query(PREVIOUS_QUERY.format(table=table_name(year)), params, connection)
+        if row:
+            if previous is None or (row[0][2], row[0][4]) > (previous[2], previous[4]):
+                previous = row[0]
+            break
+    return previous
+
+
+# Event after an event. The archives are searched from the year of the event
+# onwards, only when the event isn't newer than every archived event
+def get_next(event, connection=None):
+    params = (event[2], event[2], event[4])
+    following = execute_query(NEXT_QUERY.format(table='events'), params, connection)
+    following = following[0] if following else None
+    archives = get_archives(connection)
+    if not archives or event[2] > max(a[1] for a in archives):
+        return following
+    for year, _, _ in archives:
+        if year < int(event[2][:4]):
+            continue
+        row = execute_query(NEXT_QUERY.format(table=table_name(year)), params, connection)
+        if row:
+            if following is None or (row[0][2], row[0][3]) < (following[2], following[3]):
+                following = row[0]
+            break
+    return following
+
+
+# Move an event ending on last, and occurring on days, to its year's archive
+def archive_event(event, last, days, connection):
+    year = int(event[2][:4])
+    table = table_name(year)
+    for statement in const.ARCHIVE_SCHEMA:
+        execute_query(statement.format(table=table), (), connection)
+    execute_query(f"INSERT INTO {table} VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                  event, connection)
+    execute_query("DELETE FROM events WHERE id = ?", (event[0],), connection)
+    execute_query(
+        "INSERT INTO archives VALUES(?, ?, 1) ON CONFLICT(year) DO UPDATE\
+        SET last_date = MAX(last_date, excluded.last_date), events = events + 1",
+        (year, str(last)), connection)
+    connection.executemany(
+        "INSERT INTO archive_days VALUES(?, 1) ON CONFLICT(day) DO UPDATE\
+        SET events = events + 1",
+        [(str(day),) for day in days])
+
+
+# Move an archived event back to the events table so it can be changed there.
+# Returns whether the event was archived
+def restore(id, connection):
+    found = find_event(id, connection)
+    if found is None:
+        return False
+    table, event = found
+    recurrence = get_recurrence(id, event[2], connection)
+    days = [(str(day),) for day in (
+        [parse_date(event[2])] if recurrence is None else recurrence.occurrences())]
+    execute_query("INSERT INTO events VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                  event, connection)
+    execute_query(f"DELETE FROM {table} WHERE id = ?", (id,), connection)
+    execute_query("UPDATE archives SET events = events - 1 WHERE year = ?",
+                  (int(event[2][:4]),), connection)
+    connection.executemany(
+        "UPDATE archive_days SET events = events - 1 WHERE day = ?", days)
+    connection.executemany(
+        "DELETE FROM archive_days WHERE day = ? AND events <= 0", days)
+    return True
+
+
+# Archive the events among the next ARCHIVE_BATCH_SIZE events that start
+# before the cutoff, after the (date, time_from, id) position. Series are
+# archived once their last occurrence is before the cutoff. Returns the
+# position reached, or None when there are no more events, and the number
+# of events archived
+def archive_batch(cutoff, after, connection):
+    rows = execute_query(
+        f"SELECT {EVENT_COLUMNS}, {RECURRENCE_COLUMNS} FROM events e\
+        LEFT JOIN recurrences r ON r.event_id = e.id\
+        WHERE e.date < ? AND (e.date, e.time_from, e.id) > (?, ?, ?)\
+        ORDER BY e.date, e.time_from, e.id LIMIT ?",
+        (str(cutoff),) + after + (const.ARCHIVE_BATCH_SIZE,), connection)
+    archived = 0
+    for row in rows:
+        event = row[:11]
+        recurrence = Recurrence.from_row(event[2], row[11:])
+        if recurrence is None:
+            last = parse_date(event[2])
+            days = [last]
+        else:
+            last = recurrence.last()
+            if last is None or last >= cutoff:
+                continue
+            days = recurrence.occurrences()
+        archive_event(event, last, days, connection)
+        archived += 1
+    if not rows:
+        return None, archived
+    return (rows[-1][2], rows[-1][3], rows[-1][0]), archived
+
+
+# Archive every event that ended before the cutoff, one batch per write so
+# that requests can write between batches. Returns the number archived
+def archive_events(cutoff=None):
+    if cutoff is None:
+        cutoff = date.today() - timedelta(days=const.ARCHIVE_AFTER_DAYS)
+    after = (MIN_DATE, '', 0)
+    total = 0
+    while after is not None:
+        after, archived = execute_write(partial(archive_batch, cutoff, after))
+        total += archived
+    return total
+
+
+def run_archiver():
+    while True:
+        time.sleep(const.ARCHIVE_INTERVAL)
+        try:
+            archive_events()
+        except Exception:
+            # Try again on the next interval
+            pass
+
+
+archiver_pid = None
+
+
+# Start archiving in the background of this process, unless turned off
+def start():
+    global archiver_pid
+    if const.ARCHIVE_INTERVAL <= 0 or archiver_pid == os.getpid():
+        return
+    archiver_pid = os.getpid()
+    threading.Thread(target=run_archiver, daemon=True).start()
+
+
+if __name__ == '__main__':
+    init_db()
+    print(f"Archived {archive_events()} events")
@@ -0,0 +1,140 @@
+import asyncio
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import closing
+import util.constants as const
+import util.aiosql as aiosql
+
+# Cache of external data (holidays, forecasts, geocoding and rendered images)
+# kept in its own SQLite file so that every worker process shares one warm
+# cache instead of each worker starting cold
+
+CACHE_SCHEMA = (
+    """
+        CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            value BLOB,
+            expires REAL
+        )
+    """)
+
+
+def get_cache_db():
+    connection = sqlite3.connect(
+        f'{const.CACHE_DB_NAME}.db',
+        timeout=const.DB_TIMEOUT,
+        check_same_thread=False)
+    return connection
+
+
+def init_cache():
+    with closing(get_cache_db()) as connection:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(CACHE_SCHEMA)
+
+
+def get(key):
+    value, fresh = get_entry(key)
+    return value if fresh else None
+
+
+# Get (value, fresh) for key. Expired values are returned as not fresh until
+# they are older than the stale limit, and (None, False) after that
+def get_entry(key):
+    with closing(get_cache_db()) as connection:
+        row = connection.execute(
+            "SELECT value, expires FROM cache WHERE key = ? AND expires > ?",
+            (key, time.time() - const.CACHE_STALE_TTL)).fetchone()
+    if not row:
+        return None, False
+    return pickle.loads(row[0]), row[1] > time.time()
+
+
+def put(key, value, ttl):
+    now = time.time()
+    with closing(get_cache_db()) as connection, connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO cache VALUES(?, ?, ?)",
+            (key, pickle.dumps(value), now + ttl))
+        connection.execute("DELETE FROM cache WHERE expires <= ?",
+                           (now - const.CACHE_STALE_TTL,))
+
+
+# Return the cached value for key, otherwise call loader and cache its result.
+# An expired value is returned straight away while loader refreshes it in the
+# background. None is treated as a failed load and is never cached
+def cached(key, ttl, loader):
+    value, fresh = get_entry(key)
+    if value is None:
+        value = loader()
+        if value is not None:
+            put(key, value, ttl)
+    elif not fresh:
+        refresh(key, ttl, loader)
+    return value
+
+
+# Keys being refreshed by this process, so each is only refreshed once at a time
+refreshing = set()
+refreshing_lock = threading.Lock()
+
+
+def refresh(key, ttl, loader):
+    with refreshing_lock:
+        if key in refreshing:
+            return
+        refreshing.add(key)
+
+    def run():
+        try:
+            value = loader()
+            if value is not None:
+                put(key, value, ttl)
+        except Exception:
+            # Keep serving the stale value, the next request will try again
+            pass
+        finally:
+            with refreshing_lock:
+                refreshing.discard(key)
+    threading.Thread(target=run, daemon=True).start()
+
+
+# Async version of cached for the async server, where loader is a coroutine
+# function. The cache file is read and written on the database threads
+async def cached_async(key, ttl, loader):
+    value, fresh = await aiosql.run(get_entry, key)
+    if value is None:
+        value = await loader()
+        if value is not None:
+            await aiosql.run(put, key, value, ttl)
+    elif not fresh:
+        refresh_async(key, ttl, loader)
+    return value
+
+
+# Background refreshes of the async server, kept until they finish
+refresh_tasks = set()
+
+
+def refresh_async(key, ttl, loader):
+    with refreshing_lock:
+        if key in refreshing:
+            return
+        refreshing.add(key)
+
+    async def run():
+        try:
+            value = await loader()
+            if value is not None:
+                await aiosql.run(put, key, value, ttl)
+        except Exception:
+            # Keep serving the stale value, the next request will try again
+            pass
+        finally:
+            with refreshing_lock:
+                refreshing.discard(key)
+    task = asyncio.ensure_future(run())
+    refresh_tasks.add(task)
+    task.add_done_callback(refresh_tasks.discard)
@@ -0,0 +1,70 @@
+from util.sql import execute_query
+from util.recurrence import RECURRENCE_COLUMNS, Recurrence
+import util.archive as archive
+
+# Change feed of events for clients that keep a copy of the calendar. Every
+# write records the latest change of its event under a new sequence number,
+# replacing the event's previous change, so polling for the changes after
+# the last sequence number seen returns each changed event once. Deleted
+# events are kept as tombstones
+
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+
+EVENT_COLUMNS = "e.name, e.date, e.time_from, e.time_to, e.street, e.suburb,\
+    e.state, e.post_code, e.description"
+
+
+def record_change(id, change, last_update, connection=None):
+    execute_query(
+        "INSERT OR REPLACE INTO changes (event_id, change, last_update) VALUES(?, ?, ?)",
+        (id, change, last_update), connection)
+
+
+# Get up to size changes after the since sequence number, and whether there
+# are more after them
+def get_changes(since, size, connection=None):
+    rows = execute_query(
+        f"SELECT c.seq, c.event_id, c.change, c.last_update, {EVENT_COLUMNS},\
+        {RECURRENCE_COLUMNS} FROM changes c\
+        LEFT JOIN events e ON e.id = c.event_id\
+        LEFT JOIN recurrences r ON r.event_id = c.event_id\
+        WHERE c.seq > ? ORDER BY c.seq LIMIT ?",
+        (since, size + 1), connection)
+    changes = []
+    for row in rows[:size]:
+        # Events that are not in the events table are read from the archives
+        if row[2] != DELETED and row[5] is None:
+            archived = archive.find_event(row[1], connection)
+            if archived is not None:
+                row = row[:4] + archived[1][1:10] + row[13:]
+        changes.append(to_dict(row))
+    return changes, len(rows) > size
+
+
+# A change with the current state of its event, unless it was deleted
+def to_dict(row):
+    seq, id, change, last_update = row[:4]
+    data = {'seq': seq, 'id': id, 'change': change, 'last-update': last_update}
+    if change == DELETED:
+        return data
+    name, date, time_from, time_to, street, suburb, state, post_code, \
+        description = row[4:13]
+    data['event'] = {
+        'name': name,
+        'date': date,
+        'from': time_from,
+        'to': time_to,
+        'location': {
+            'street': street,
+            'suburb': suburb,
+            'state': state,
+            'post-code': post_code
+        },
+        'description': description
+    }
+    recurrence = Recurrence.from_row(date, row[13:])
+    if recurrence is not None:
+        data['event']['recurrence'] = recurrence.to_dict()
+    return data
@@ -1,7 +1,81 @@
+import os
+
 # General
 API_NAME = 'Events API'
 API_DESCRIPTION = 'Time-management and scheduling calendar service API for Australians.'
 DB_NAME = 'database'
+DB_TIMEOUT = 30
+
+# Storage mode: 'file' reads and writes the database file, 'memory' keeps the
+# database in memory and snapshots it to the file every DB_SNAPSHOT_INTERVAL
+# seconds. Memory mode needs a single worker process
+DB_MODE = os.environ.get('DB_MODE', 'file')
+DB_SNAPSHOT_INTERVAL = float(os.environ.get('DB_SNAPSHOT_INTERVAL', 5))
+
+# Group commit of writes: how long the writer waits for more writes after the
+# first one of a batch (seconds), and the most writes committed together
+WRITE_BATCH_WINDOW = float(os.environ.get('WRITE_BATCH_WINDOW', 0.002))
+WRITE_BATCH_SIZE = int(os.environ.get('WRITE_BATCH_SIZE', 64))
+
+# Shared cache of external data, stored beside the database
+CACHE_DB_NAME = 'cache'
+HOLIDAY_TTL = 24 * 60 * 60
+FORECAST_TTL = 60 * 60
+IMAGE_TTL = 30 * 60
+# Expired cache entries are still served for this long while they are
+# refreshed in the background
+CACHE_STALE_TTL = 24 * 60 * 60
+
+# External APIs: base URLs, and seconds allowed to connect and for a whole
+# response. The URLs can point at a local stub upstream for benchmarks
+NAGER_DATE_URL = os.environ.get('NAGER_DATE_URL', 'https://date.nager.at')
+SEVEN_TIMER_URL = os.environ.get('SEVEN_TIMER_URL', 'https://www.7timer.info')
+UPSTREAM_CONNECT_TIMEOUT = 3.05
+NAGER_DATE_TIMEOUT = 5
+SEVEN_TIMER_TIMEOUT = 10
+UPSTREAM_POOL_SIZE = 10
+# Bodies are read in small chunks so the time budget is checked often
+UPSTREAM_CHUNK_SIZE = 1024
+
+# A provider's circuit opens when at least BREAKER_ERROR_RATE of its requests
+# in the last BREAKER_WINDOW seconds failed (with BREAKER_MIN_CALLS or more
+# requests), and it is retried after BREAKER_COOLDOWN seconds
+BREAKER_ERROR_RATE = 0.5
+BREAKER_MIN_CALLS = 5
+BREAKER_WINDOW = 30
+BREAKER_COOLDOWN = 30
+
+# Async server: threads running the blocking database and cache calls, and the
+# most connections open to each external API at once, which bounds the number
+# of requests waiting on a slow provider together
+ASYNC_DB_THREADS = int(os.environ.get('ASYNC_DB_THREADS', 8))
+ASYNC_UPSTREAM_POOL_SIZE = int(os.environ.get('ASYNC_UPSTREAM_POOL_SIZE', 1000))
+# Connections the async server lets wait to be accepted
+ASYNC_BACKLOG = 2048
+
+# Images are drawn by RENDER_PROCESSES processes per worker. Once
+# RENDER_QUEUE_LIMIT more renders are waiting, or a render takes longer than
+# RENDER_TIMEOUT seconds, requests are told to retry after RENDER_RETRY_AFTER
+RENDER_PROCESSES = int(os.environ.get('RENDER_PROCESSES', 2))
+RENDER_QUEUE_LIMIT = int(os.environ.get('RENDER_QUEUE_LIMIT', 8))
+RENDER_TIMEOUT = 30
+RENDER_RETRY_AFTER = 5
+BASE_MAP_PATH = 'util/au_map.jpg'
+BASE_MAP_EXTENT = [112.90, 153.70, -43.70, -10.50]
+
+# Events that ended more than ARCHIVE_AFTER_DAYS ago are moved to a table per
+# year, ARCHIVE_BATCH_SIZE events per transaction, every ARCHIVE_INTERVAL
+# seconds (0 turns the background archiver off)
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_INTERVAL = float(os.environ.get('ARCHIVE_INTERVAL', 60 * 60))
+
+# Memory diagnostics, off unless MEMORY_DIAGNOSTICS=1 as tracing slows every
+# allocation down. Allocations are traced with MEMORY_TRACE_FRAMES frames each
+# and reports list the MEMORY_TOP_STATS largest allocation sites
+MEMORY_DIAGNOSTICS = os.environ.get('MEMORY_DIAGNOSTICS') == '1'
+MEMORY_TRACE_FRAMES = int(os.environ.get('MEMORY_TRACE_FRAMES', 1))
+MEMORY_TOP_STATS = 10
 
 # Schema
 SCHEMA = (
@@ -18,14 +92,81 @@ SCHEMA = (
             post_code TEXT,
             description TEXT,
             last_update DATETIME
-        )
+        );
+        CREATE INDEX IF NOT EXISTS events_date ON events (date, time_from);
+        CREATE TABLE IF NOT EXISTS recurrences (
+            event_id INTEGER PRIMARY KEY,
+            freq TEXT,
+            interval INTEGER,
+            count INTEGER,
+            until DATE,
+            exceptions TEXT
+        );
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER UNIQUE,
+            change TEXT,
+            last_update DATETIME
+        );
+        INSERT INTO changes (event_id, change, last_update)
+            SELECT id, 'created', last_update FROM events
+            WHERE NOT EXISTS (SELECT 1 FROM changes) ORDER BY id;
+        CREATE TABLE IF NOT EXISTS archives (
+            year INTEGER PRIMARY KEY,
+            last_date DATE,
+            events INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS archive_days (
+            day DATE PRIMARY KEY,
+            events INTEGER
+        );
     """)
 
+# Schema of the archive of a year, with the same columns as events
+ARCHIVE_SCHEMA = (
+    """
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            date DATE,
+            time_from TIME,
+            time_to TIME,
+            street TEXT,
+            suburb TEXT,
+            state TEXT,
+            post_code TEXT,
+            description TEXT,
+            last_update DATETIME
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS {table}_date ON {table} (date, time_from)")
+
 FIELDS = {'name', 'date', 'from', 'to', 'location', 'description'}
+OPTIONAL_FIELDS = {'recurrence'}
 ORDER_FIELDS = {'id', 'name', 'datetime'}
 FILTER_FIELDS = {'id', 'name', 'date', 'from', 'to', 'location'}
 LOCATION_FIELDS = {'street', 'suburb', 'state', 'post-code'}
 
+# Database columns selected for each filter field, and the response key used
+# for columns that are not named after their field
+FILTER_COLUMNS = {
+    'location': 'street,suburb,state,post_code',
+    'from': 'time_from',
+    'to': 'time_to'
+}
+COLUMN_KEYS = {'time_from': 'time', 'time_to': 'to'}
+LOCATION_COLUMNS = {'street', 'suburb', 'state', 'post_code'}
+
+# Change feed page size, and the largest page a client may ask for
+CHANGES_PAGE_SIZE = 100
+CHANGES_MAX_PAGE_SIZE = 1000
+
+# Response compression
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain'}
+COMPRESSION_THRESHOLD = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
 # Error messages
 INVALID_NAME_MSG = "{} is an invalid name. Please use a name with 1-64 characters"
 INVALID_DATE_MSG = "{} is an invalid date format. Please use the YY-MM-DD format"
@@ -36,6 +177,13 @@ INVALID_SUBURB_MSG = "{} is an invalid suburb. Please use a suburb with 1-64 cha
 INVALID_POSTCODE_MSG = "{} is not a valid Australian postcode"
 INVALID_STATE_MSG = "{} is not a valid Australian state"
 INVALID_DESCRIPTION_MSG = "{} is an invalid description. Please use a description with 1-64 characters"
+INVALID_FREQ_MSG = "{} is an invalid frequency. Please use daily, weekly or monthly"
+INVALID_INTERVAL_MSG = "{} is an invalid interval. Please use a number from 1 to 100"
+INVALID_COUNT_MSG = "{} is an invalid count. Please use a number from 1 to 1000"
+INVALID_UNTIL_MSG = "{} is an invalid until date. Please use a date in the YY-MM-DD format"
+INVALID_UNTIL_RANGE_MSG = "{} is an invalid until date. Please use a date on or after the event date"
+INVALID_COUNT_UNTIL_MSG = "Please use either count or until, not both"
+INVALID_EXCEPTIONS_MSG = "Invalid exceptions. Please use a list of dates in the YY-MM-DD format"
 
 # Location Data
 STATE_ABBREVIATIONS = {
@@ -57,6 +205,69 @@ STATE_ABBREVIATIONS = {
     'AUSTRALIAN CAPITAL TERRITORY': 'Australian Capital Territory'
 }
 
+# Recurring events
+RECURRENCE_FREQUENCIES = {'daily', 'weekly', 'monthly'}
+RECURRENCE_HORIZON_DAYS = 366
+# Longest date window of GET /events, and the most days a series is
+# expanded over in statistics
+MAX_WINDOW_DAYS = 3660
+# Largest count and interval a rule may have
+RECURRENCE_MAX_COUNT = 1000
+RECURRENCE_MAX_INTERVAL = 100
+
+# Geocoding
+GRID_CELL_SIZE = 1.0
+GEOCODE_CACHE_SIZE = 4096
+
+# Approximate region of each postcode range as (low, high, city, state). The
+# first matching range is used, so single towns are listed before the
+# state-wide ranges they fall in
+POSTCODE_REGIONS = [
+    (2300, 2308, 'Newcastle', 'NSW'),
+    (2340, 2340, 'Tamworth', 'NSW'),
+    (2444, 2444, 'Port Macquarie', 'NSW'),
+    (2450, 2450, 'Coffs Harbour', 'NSW'),
+    (2500, 2530, 'Wollongong', 'NSW'),
+    (2640, 2640, 'Albury', 'NSW'),
+    (2800, 2800, 'Orange', 'NSW'),
+    (2830, 2830, 'Dubbo', 'NSW'),
+    (3212, 3228, 'Geelong', 'VIC'),
+    (3350, 3356, 'Ballarat', 'VIC'),
+    (3500, 3500, 'Mildura', 'VIC'),
+    (3550, 3556, 'Bendigo', 'VIC'),
+    (3630, 3630, 'Shepparton', 'VIC'),
+    (4207, 4230, 'Gold Coast', 'QLD'),
+    (4350, 4350, 'Toowoomba', 'QLD'),
+    (4670, 4670, 'Bundaberg', 'QLD'),
+    (4700, 4702, 'Rockhampton', 'QLD'),
+    (4740, 4740, 'Mackay', 'QLD'),
+    (4810, 4815, 'Townsville', 'QLD'),
+    (4825, 4825, 'Mount Isa', 'QLD'),
+    (4870, 4870, 'Cairns', 'QLD'),
+    (5290, 5290, 'Mount Gambier', 'SA'),
+    (5600, 5600, 'Whyalla', 'SA'),
+    (6230, 6230, 'Bunbury', 'WA'),
+    (6430, 6430, 'Kalgoorlie', 'WA'),
+    (6530, 6530, 'Geraldton', 'WA'),
+    (6725, 6725, 'Broome', 'WA'),
+    (7248, 7250, 'Launceston', 'TAS'),
+    (7310, 7310, 'Devonport', 'TAS'),
+    (7320, 7320, 'Burnie', 'TAS'),
+    (870, 872, 'Alice Springs', 'NT'),
+    (200, 299, 'Canberra', 'ACT'),
+    (2600, 2618, 'Canberra', 'ACT'),
+    (2900, 2920, 'Canberra', 'ACT'),
+    (800, 999, 'Darwin', 'NT'),
+    (1000, 2999, 'Sydney', 'NSW'),
+    (3000, 3999, 'Melbourne', 'VIC'),
+    (8000, 8999, 'Melbourne', 'VIC'),
+    (4000, 4999, 'Brisbane', 'QLD'),
+    (9000, 9999, 'Brisbane', 'QLD'),
+    (5000, 5999, 'Adelaide', 'SA'),
+    (6000, 6999, 'Perth', 'WA'),
+    (7000, 7999, 'Hobart', 'TAS'),
+]
+
 POPULAR_LOCATIONS = [
     'Sydney',
     'Canberra',
@@ -0,0 +1,134 @@
+import json
+import linecache
+import os
+import signal
+import sys
+import threading
+import tracemalloc
+from flask import g, request
+import util.constants as const
+
+# Opt-in memory diagnostics for long-running workers, built on tracemalloc.
+# The peak allocation of each request is recorded per endpoint, and a report
+# of the memory traced in this process, its largest allocation sites and the
+# sites that grew since the previous report can be read from
+# /diagnostics/memory or written to stderr by sending the worker SIGUSR2.
+# The peak of a request is the peak of the whole process while it ran, so it
+# is only exact when requests don't overlap
+
+# Allocations made by tracemalloc itself and by imports are left out
+FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+# Peak allocations of each endpoint as [requests, largest peak, sum of peaks]
+request_peaks = {}
+# Snapshot of the previous report, which the next report is compared with
+last_snapshot = None
+lock = threading.Lock()
+
+
+def is_enabled():
+    return tracemalloc.is_tracing()
+
+
+def start():
+    global last_snapshot
+    if not const.MEMORY_DIAGNOSTICS or tracemalloc.is_tracing():
+        return
+    tracemalloc.start(const.MEMORY_TRACE_FRAMES)
+    last_snapshot = take_snapshot()
+
+
+# Write a report to stderr when the process gets SIGUSR2. Must be called from
+# the main thread
+def handle_signal():
+    if const.MEMORY_DIAGNOSTICS and hasattr(signal, 'SIGUSR2'):
+        signal.signal(signal.SIGUSR2, write_report)
+
+
+def write_report(signum=None, frame=None):
+    sys.stderr.write(json.dumps(report(), indent=2) + "\n")
+    sys.stderr.flush()
+
+
+def take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(FILTERS)
+
+
+def get_rss():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+# Peak allocation per request is only tracked where the peak can be reset,
+# from Python 3.9
+def before_request():
+    if is_enabled() and hasattr(tracemalloc, 'reset_peak'):
+        g.memory_start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+
+def after_request(response):
+    start = g.pop('memory_start', None)
+    if start is not None and is_enabled():
+        rule = request.url_rule.rule if request.url_rule else 'unmatched'
+        record(f"{request.method} {rule}", tracemalloc.get_traced_memory()[1] - start)
+    return response
+
+
+def record(endpoint, peak):
+    with lock:
+        stats = request_peaks.setdefault(endpoint, [0, 0, 0])
+        stats[0] += 1
+        stats[1] = max(stats[1], peak)
+        stats[2] += peak
+
+
+def format_site(stat):
+    frame = stat.traceback[0]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+# Report of the memory of this process. The snapshot taken for it becomes the
+# one the next report is compared with
+def report():
+    global last_snapshot
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = take_snapshot()
+    with lock:
+        previous, last_snapshot = last_snapshot, snapshot
+        requests = {endpoint: {
+            'requests': count,
+            'peak-max': largest,
+            'peak-mean': total // count,
+        } for endpoint, (count, largest, total) in sorted(request_peaks.items())}
+    data = {
+        'pid': os.getpid(),
+        'rss': get_rss(),
+        'traced': current,
+        'traced-peak': peak,
+        'requests': requests,
+        'top': [{
+            'site': format_site(stat),
+            'size': stat.size,
+            'count': stat.count,
+        } for stat in snapshot.statistics('lineno')[:const.MEMORY_TOP_STATS]],
+    }
+    if previous is not None:
+        data['growth'] = [{
+            'site': format_site(stat),
+            'size': stat.size_diff,
+            'count': stat.count_diff,
+        } for stat in snapshot.compare_to(previous, 'lineno')[:const.MEMORY_TOP_STATS]]
+    return data
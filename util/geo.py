@@ -0,0 +1,111 @@
+import math
+import os
+from collections import defaultdict
+from functools import lru_cache
+import pandas as pd
+import util.constants as const
+
+# Geocoding of event locations to forecast points. An event is located by its
+# suburb, or by its postcode when the suburb is unknown, and then snapped to
+# the nearest bundled location so that nearby events share one forecast
+
+
+class GridIndex:
+    '''Nearest-neighbour index over (lat, lng) points bucketed into a square grid'''
+
+    def __init__(self, points, cell=const.GRID_CELL_SIZE):
+        self.cell = cell
+        self.cells = defaultdict(list)
+        for point in points:
+            self.cells[self._key(point[0], point[1])].append(point)
+        rows = [i for i, _ in self.cells] or [0]
+        cols = [j for _, j in self.cells] or [0]
+        self.bounds = min(rows), max(rows), min(cols), max(cols)
+
+    def _key(self, lat, lng):
+        return math.floor(lat / self.cell), math.floor(lng / self.cell)
+
+    def nearest(self, lat, lng):
+        # Search rings of cells outwards until no closer point can exist.
+        # Longitude is scaled so distances are roughly equal in both axes
+        scale = math.cos(math.radians(lat))
+        row, col = self._key(lat, lng)
+        min_row, max_row, min_col, max_col = self.bounds
+        max_ring = max(abs(row - min_row), abs(row - max_row),
+                       abs(col - min_col), abs(col - max_col))
+        best, best_dist = None, math.inf
+        for ring in range(max_ring + 1):
+            if (ring - 1) * self.cell * scale > best_dist:
+                break
+            for i in range(row - ring, row + ring + 1):
+                for j in range(col - ring, col + ring + 1):
+                    if max(abs(i - row), abs(j - col)) != ring:
+                        continue
+                    for point in self.cells.get((i, j), ()):
+                        dist = math.hypot(point[0] - lat, (point[1] - lng) * scale)
+                        if dist < best_dist:
+                            best, best_dist = point, dist
+        return best
+
+
+# Known places as (lat, lng, name, state) from the bundled location data, and
+# from the suburb data when it is available
+@lru_cache(maxsize=None)
+def get_places():
+    au_df = pd.read_csv("data/au_location.csv")
+    places = [(row.lat, row.lng, row.city, row.admin_name)
+              for row in au_df.itertuples()]
+    if os.path.exists("data/au_geo.csv"):
+        geo_df = pd.read_csv("data/au_geo.csv", delimiter=';')
+        geo_df = geo_df[['Geo Point', 'Official Name Suburb',
+                         'Official Name State']].dropna()
+        for point, suburb, state in geo_df.itertuples(index=False):
+            lat, lng = point.split(',')
+            places.append((float(lat), float(lng), suburb, state))
+    return places
+
+
+@lru_cache(maxsize=None)
+def get_places_by_name():
+    places = defaultdict(list)
+    for place in get_places():
+        places[(place[2].lower(), place[3])].append(place)
+    return places
+
+
+# Forecasts are only fetched for the bundled locations
+@lru_cache(maxsize=None)
+def get_forecast_index():
+    au_df = pd.read_csv("data/au_location.csv")
+    return GridIndex([(row.lat, row.lng) for row in au_df.itertuples()])
+
+
+def find_suburb(suburb, state):
+    state = const.STATE_ABBREVIATIONS[state.upper()]
+    places = get_places_by_name().get((suburb.lower(), state))
+    if places:
+        return places[0]
+    # Otherwise fall back to a partial match of the suburb name
+    for place in get_places():
+        if place[3] == state and suburb in place[2]:
+            return place
+    return None
+
+
+# Get the place of the region a postcode belongs to, or None if the postcode
+# is outside every known range
+def find_postcode(postcode):
+    postcode = int(postcode)
+    for low, high, city, state in const.POSTCODE_REGIONS:
+        if low <= postcode <= high:
+            return find_suburb(city, state)
+    return None
+
+
+# Get the (lat, lng) forecast point for a location, or None if it can't be located
+@lru_cache(maxsize=const.GEOCODE_CACHE_SIZE)
+def locate(suburb, state, postcode):
+    place = find_suburb(suburb, state) or find_postcode(postcode)
+    if place is None:
+        return None
+    return get_forecast_index().nearest(place[0], place[1])
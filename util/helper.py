@@ -1,6 +1,11 @@
 from datetime import timezone, timedelta
 import time
 from util.sql import execute_query
+import util.constants as const
+import util.cache as cache
+import util.archive as archive
+from util.upstream import nager_date, seven_timer, async_nager_date, \
+    async_seven_timer, UpstreamError
 
 def convert_to_utc(dt):
     # Get the local timezone as a string (e.g. 'PST', 'EST', 'CET', etc.)
@@ -16,7 +21,48 @@ def convert_to_utc(dt):
     return dt.astimezone(timezone.utc)
 
 def get_total_events():
-    return execute_query("SELECT COUNT(*) FROM events")[0][0]
+    return execute_query("SELECT COUNT(*) FROM events")[0][0] + archive.get_total_archived()
 
 def get_datetime_in_format(dt_obj, format="%Y-%m-%d %H:%M:%S"):
     return dt_obj.strftime(format)
+
+# Get the JSON body of an external API, or None if the request failed
+def fetch_json(provider, url):
+    try:
+        return provider.get_json(url)
+    except UpstreamError:
+        return None
+
+# Get the public holidays of a year from Nager.Date, shared between workers through the cache
+def get_holidays(year):
+    return cache.cached(f'holidays:{year}', const.HOLIDAY_TTL,
+                        lambda: fetch_json(nager_date, holidays_url(year)))
+
+# Get the forecast for a location from 7timer, shared between workers through the cache
+def get_forecast(lat, lng):
+    return cache.cached(f'forecast:{lat}:{lng}', const.FORECAST_TTL,
+                        lambda: fetch_json(seven_timer, forecast_url(lat, lng)))
+
+def holidays_url(year):
+    return f"{const.NAGER_DATE_URL}/api/v2/publicholidays/{year}/AU"
+
+def forecast_url(lat, lng):
+    return f"{const.SEVEN_TIMER_URL}/bin/civil.php?lon={lng}&lat={lat}&lang=en&ac=0&unit=metric&output=json"
+
+# Async versions of the above for the async server, sharing the same cache
+async def fetch_json_async(provider, url):
+    try:
+        return await provider.get_json(url)
+    except UpstreamError:
+        return None
+
+async def get_holidays_async(year):
+    return await cache.cached_async(
+        f'holidays:{year}', const.HOLIDAY_TTL,
+        lambda: fetch_json_async(async_nager_date, holidays_url(year)))
+
+async def get_forecast_async(lat, lng):
+    return await cache.cached_async(
+        f'forecast:{lat}:{lng}', const.FORECAST_TTL,
+        lambda: fetch_json_async(async_seven_timer, forecast_url(lat, lng)))
+
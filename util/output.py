@@ -0,0 +1,73 @@
+import gzip
+import json
+from operator import itemgetter
+from flask import request
+import util.constants as const
+
+# Optional faster encoders and compressors, used only when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Serialize data to a JSON body, falling back to the standard library when
+# orjson is not installed or cannot encode the data
+def dumps(data):
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            pass
+    return json.dumps(data) + "\n"
+
+
+# Build a function that turns a result row of the given columns into an
+# event dict, so the column names are only looked at once per request
+def compile_projection(columns):
+    fields = []
+    location = []
+    for i, column in enumerate(columns):
+        if column in const.LOCATION_COLUMNS:
+            # Location columns are grouped under the first one's position
+            if not location:
+                fields.append(('location', lambda row: {name: row[j] for j, name in location}))
+            location.append((i, column.replace('_', '-')))
+        else:
+            fields.append((const.COLUMN_KEYS.get(column, column), itemgetter(i)))
+
+    def project(row):
+        return {key: get(row) for key, get in fields}
+    return project
+
+
+# Compress responses above the size threshold with the best encoding the
+# client accepts
+def compress(response):
+    if (response.direct_passthrough
+            or response.status_code < 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in const.COMPRESSIBLE_MIMETYPES
+            or response.content_length is None
+            or response.content_length < const.COMPRESSION_THRESHOLD):
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        encoding = 'br'
+        body = brotli.compress(response.get_data(), quality=const.BROTLI_QUALITY)
+    elif accepted['gzip']:
+        encoding = 'gzip'
+        body = gzip.compress(response.get_data(), compresslevel=const.GZIP_LEVEL)
+    else:
+        return response
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
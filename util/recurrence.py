@@ -0,0 +1,288 @@
+from calendar import monthrange
+from math import gcd
+from datetime import date, datetime, timedelta
+import itertools
+import util.constants as const
+from util.sql import execute_query, iterate_query
+
+# Recurring events are stored once, as an events row holding the first
+# occurrence plus a recurrences row holding the rule. Occurrences are never
+# stored; they are generated on demand within the dates a query asks for
+
+RECURRENCE_COLUMNS = "r.freq, r.interval, r.count, r.until, r.exceptions"
+
+# Events of a table that may occur between two dates: single events on those
+# dates and series that started before the end and have not finished before
+# the start
+def active_events(table='events'):
+    return f"FROM {table} e LEFT JOIN recurrences r ON r.event_id = e.id\
+    WHERE e.date <= ? AND ((r.event_id IS NULL AND e.date >= ?)\
+    OR (r.event_id IS NOT NULL AND (r.until IS NULL OR r.until >= ?)))"
+
+MIN_DATE = '0001-01-01'
+MAX_DATE = '9999-12-31'
+
+
+def parse_date(date_str):
+    return datetime.strptime(date_str, '%Y-%m-%d').date()
+
+
+class Recurrence:
+    '''Recurrence rule of an event series, a subset of the iCalendar RRULE'''
+
+    def __init__(self, start, freq, interval=1, count=None, until=None,
+                 exceptions=()):
+        self.start = start
+        self.freq = freq
+        self.interval = interval
+        self.count = count
+        self.until = until
+        self.exceptions = frozenset(exceptions)
+
+    # Build a rule from the payload of a request
+    @classmethod
+    def from_data(cls, start, data):
+        return cls(parse_date(start),
+                   data['freq'],
+                   data.get('interval', 1),
+                   data.get('count'),
+                   parse_date(data['until']) if data.get('until') else None,
+                   [parse_date(d) for d in data.get('exceptions', [])])
+
+    # Build a rule from the RECURRENCE_COLUMNS of a row, or None for a single event
+    @classmethod
+    def from_row(cls, start, row):
+        freq, interval, count, until, exceptions = row
+        if freq is None:
+            return None
+        return cls(parse_date(start), freq, interval, count,
+                   parse_date(until) if until else None,
+                   [parse_date(d) for d in exceptions.split(',') if d])
+
+    def to_row(self):
+        return (self.freq, self.interval, self.count,
+                str(self.until) if self.until else None,
+                ','.join(sorted(str(d) for d in self.exceptions)))
+
+    def to_dict(self):
+        data = {'freq': self.freq, 'interval': self.interval}
+        if self.count is not None:
+            data['count'] = self.count
+        if self.until is not None:
+            data['until'] = str(self.until)
+        if self.exceptions:
+            data['exceptions'] = sorted(str(d) for d in self.exceptions)
+        return data
+
+    # Date of the nth slot of the rule, or None if that month has no such day.
+    # Raises OverflowError for a slot after date.max
+    def _nth(self, n):
+        if self.freq == 'monthly':
+            month = self.start.month - 1 + n * self.interval
+            year, month = self.start.year + month // 12, month % 12 + 1
+            if year > date.max.year:
+                raise OverflowError("date value out of range")
+            if self.start.day > monthrange(year, month)[1]:
+                return None
+            return date(year, month, self.start.day)
+        return self.start + timedelta(days=n * self._step())
+
+    def _step(self):
+        return self.interval * (7 if self.freq == 'weekly' else 1)
+
+    # Slot of a date in the rule, or None if the rule never lands on it
+    def _slot(self, day):
+        if self.freq == 'monthly':
+            months = (day.year - self.start.year) * 12 + day.month - self.start.month
+            if day.day != self.start.day or months < 0 or months % self.interval:
+                return None
+            return months // self.interval
+        days = (day - self.start).days
+        if days < 0 or days % self._step():
+            return None
+        return days // self._step()
+
+    # First slot on or after a date
+    def _slot_from(self, day):
+        if day <= self.start:
+            return 0
+        if self.freq == 'monthly':
+            months = (day.year - self.start.year) * 12 + day.month - self.start.month
+            if day.day > self.start.day:
+                months += 1
+            return -(-months // self.interval)
+        return -(-(day - self.start).days // self._step())
+
+    # Number of occurrences before a slot, counting exceptions, as COUNT does
+    def _index(self, n):
+        if self.freq != 'monthly' or self.start.day <= 28:
+            return n
+        return sum(1 for i in range(n) if self._nth(i) is not None)
+
+    # Date no occurrence can be after, or None if the rule never ends. A count
+    # reaching past date.max ends the rule there
+    def last(self):
+        last = self.until
+        if self.count is not None:
+            try:
+                if self.freq != 'monthly' or self.start.day <= 28:
+                    day = self._nth(self.count - 1)
+                else:
+                    days = filter(None, map(self._nth, itertools.count()))
+                    day = next(itertools.islice(days, self.count - 1, None))
+            except OverflowError:
+                day = date.max
+            last = min(last, day) if last else day
+        return last
+
+    def occurs_on(self, day):
+        n = self._slot(day)
+        return (n is not None
+                and (self.until is None or day <= self.until)
+                and (self.count is None or self._index(n) < self.count)
+                and day not in self.exceptions)
+
+    # Generate the occurrences between start and end (inclusive). Without an
+    # end the generator only stops when the rule does
+    def occurrences(self, start=None, end=None):
+        last = self.last()
+        if end is None or (last is not None and last < end):
+            end = last
+        n = self._slot_from(start) if start else 0
+        index = self._index(n)
+        while True:
+            try:
+                day = self._nth(n)
+            except OverflowError:
+                return
+            n += 1
+            if day is None:
+                continue
+            if (end is not None and day > end) or (
+                    self.count is not None and index >= self.count):
+                return
+            index += 1
+            if day not in self.exceptions:
+                yield day
+
+    # Whether the rule and another rule have a date in common. Two rules that
+    # step by days, or two monthly rules, are solved for the slots they share,
+    # however far ahead those are. Otherwise the occurrences of the monthly
+    # rule are walked up to the earlier last date of the two, or up to horizon
+    # when neither ends. A walk stopped after RECURRENCE_MAX_COUNT occurrences
+    # counts as sharing a date, so that no series is accepted unchecked
+    def shares_date(self, other, horizon):
+        if (self.freq == 'monthly') == (other.freq == 'monthly'):
+            return any(self.occurs_on(day) and other.occurs_on(day)
+                       for day in self._common_slots(other))
+        monthly, stepped = (self, other) if self.freq == 'monthly' else (other, self)
+        ends = [rule.last() for rule in (self, other) if rule.last() is not None]
+        days = monthly.occurrences(max(self.start, other.start), min(ends, default=horizon))
+        for i, day in enumerate(days):
+            if i == const.RECURRENCE_MAX_COUNT or stepped.occurs_on(day):
+                return True
+        return False
+
+    # Dates of the slots shared with a rule stepping by the same unit, up to
+    # the earlier last date of the two. Exceptions and counts are left to
+    # occurs_on
+    def _common_slots(self, other):
+        if self.freq == 'monthly':
+            if self.start.day != other.start.day:
+                return
+            firsts = (self.start.year * 12 + self.start.month - 1,
+                      other.start.year * 12 + other.start.month - 1)
+            steps = (self.interval, other.interval)
+        else:
+            firsts = (self.start.toordinal(), other.start.toordinal())
+            steps = (self._step(), other._step())
+        # Solve slot = firsts[i] (mod steps[i]) for both rules; the shared
+        # slots are then lcm apart
+        divisor = gcd(*steps)
+        if (firsts[1] - firsts[0]) % divisor:
+            return
+        modulus = steps[1] // divisor
+        slot = firsts[0] + steps[0] * ((firsts[1] - firsts[0]) // divisor
+                                       * pow(steps[0] // divisor, -1, modulus) % modulus)
+        lcm = steps[0] * modulus
+        slot += -(-(max(firsts) - slot) // lcm) * lcm
+        ends = [rule.last() for rule in (self, other) if rule.last() is not None]
+        end = min(ends, default=date.max)
+        while True:
+            if self.freq != 'monthly':
+                if slot > end.toordinal():
+                    return
+                yield date.fromordinal(slot)
+            else:
+                year, month = divmod(slot, 12)
+                if (year, month + 1) > (end.year, end.month):
+                    return
+                # Months without the day have no occurrence
+                if self.start.day <= monthrange(year, month + 1)[1]:
+                    yield date(year, month + 1, self.start.day)
+            slot += lcm
+
+
+# Date open-ended series starting on start are expanded up to
+def get_horizon(start):
+    start = max(start, date.today())
+    return start + min(timedelta(days=const.RECURRENCE_HORIZON_DAYS), date.max - start)
+
+
+def get_recurrence(id, start, connection=None):
+    row = execute_query(
+        f"SELECT {RECURRENCE_COLUMNS} FROM recurrences r WHERE r.event_id = ?",
+        (id,), connection)
+    return Recurrence.from_row(start, row[0]) if row else None
+
+
+def save_recurrence(id, recurrence, connection=None):
+    execute_query("INSERT OR REPLACE INTO recurrences VALUES(?, ?, ?, ?, ?, ?)",
+                  (id,) + recurrence.to_row(), connection)
+
+
+# Generate the date of every single event and series occurrence between start
+# and end in the given tables. Without dates, series are only expanded over
+# the MAX_WINDOW_DAYS up to their recurrence horizon, however long ago they
+# started or far ahead they end
+def event_dates(start=None, end=None, tables=('events',), connection=None):
+    for table in tables:
+        rows = iterate_query(
+            f"SELECT e.date, {RECURRENCE_COLUMNS} {active_events(table)}",
+            (str(end) if end else MAX_DATE,
+             str(start) if start else MIN_DATE,
+             str(start) if start else MIN_DATE), connection)
+        for row in rows:
+            recurrence = Recurrence.from_row(row[0], row[1:])
+            if recurrence is None:
+                yield parse_date(row[0])
+            else:
+                horizon = get_horizon(recurrence.start)
+                yield from recurrence.occurrences(
+                    start or horizon - timedelta(days=const.MAX_WINDOW_DAYS),
+                    end or horizon)
+
+
+# Generate the rows of every single event and series occurrence between start
+# and end in the given tables, with the date column of an occurrence set to
+# the occurrence date
+def expand_events(columns, start, end, tables=('events',), connection=None):
+    rows = itertools.chain.from_iterable(
+        iterate_query(
+            f"SELECT {columns}, e.date, {RECURRENCE_COLUMNS} {active_events(table)}",
+            (str(end), str(start), str(start)), connection)
+        for table in tables)
+    names = columns.split(',')
+    num_columns = len(names)
+    date_indexes = [i for i, name in enumerate(names) if name == 'date']
+    for row in rows:
+        event = row[:num_columns]
+        recurrence = Recurrence.from_row(row[num_columns], row[num_columns + 1:])
+        if recurrence is None:
+            yield event
+            continue
+        event = list(event)
+        for day in recurrence.occurrences(start, end):
+            for i in date_indexes:
+                event[i] = str(day)
+            yield tuple(event)
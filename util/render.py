@@ -0,0 +1,171 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+import util.constants as const
+
+# Charts and maps are drawn in a small pool of render processes, so drawing
+# doesn't hold the GIL of the request threads or keep matplotlib's memory in
+# the server. Request threads hand plain data to a render function and get
+# PNG bytes back. Each render process loads matplotlib and the base map once
+
+
+class RenderBusy(Exception):
+    pass
+
+
+# Base map image, loaded once in each render process
+base_map = None
+
+
+def _init_process():
+    global base_map
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.image
+    base_map = matplotlib.image.imread(const.BASE_MAP_PATH)
+
+
+def _warm():
+    return os.getpid()
+
+
+# Figures are created without pyplot, so none are kept open once drawn
+def _to_png(fig, **kwargs):
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', **kwargs)
+    return buffer.getvalue()
+
+
+# Bar chart of the number of events in each month of a year
+def draw_statistics(events_per_month, year):
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import MaxNLocator
+    fig = Figure()
+    ax = fig.subplots()
+    ax.bar(list(events_per_month.keys()), list(events_per_month.values()))
+    ax.set_xlabel('Month')
+    ax.set_ylabel('Number of Events')
+    ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+    ax.set_title(f'Events per Month in Current Year ({year})')
+    return _to_png(fig)
+
+
+# Map of Australia with the temperature of each (city, lat, lng, temperature)
+def draw_weather(cities):
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 10))
+    ax = fig.subplots()
+    ax.imshow(base_map, extent=const.BASE_MAP_EXTENT)
+
+    # Add annotation boxes to the points
+    for city, lat, lng, temperature in cities:
+        xytext = (-60, 5) if city == 'Brisbane' else (-30, 5)
+        bbox_props = dict(boxstyle="round", facecolor="white", edgecolor="black")
+        ax.annotate(f"{city} {int(temperature)}°C", xy=(lng, lat), xytext=xytext,
+                    textcoords="offset points", bbox=bbox_props, fontsize=8)
+
+    # Remove x and y axis
+    ax.set_xticks([])
+    ax.set_yticks([])
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+
+    # Plot the points hidden, so the map is framed around them
+    ax.scatter([city[2] for city in cities], [city[1] for city in cities], alpha=0)
+    return _to_png(fig, bbox_inches='tight')
+
+
+class RenderPool:
+    '''Pool of render processes with a bounded number of queued renders'''
+
+    def __init__(self, processes=const.RENDER_PROCESSES, queue_limit=const.RENDER_QUEUE_LIMIT):
+        self.processes = processes
+        self.queue_limit = queue_limit
+        self.executor = None
+        self.slots = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    # Start every render process now rather than on the first renders
+    def start(self):
+        executor, _ = self._get_executor()
+        for future in [executor.submit(_warm) for _ in range(self.processes)]:
+            future.result()
+
+    # The processes are started by each worker process that uses the pool.
+    # They are spawned rather than forked, as the worker already runs threads.
+    # A spawned process imports the script that started the server again as
+    # __mp_main__, so entry points keep their setup out of module level
+    def _get_executor(self):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.executor = ProcessPoolExecutor(
+                        self.processes,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_init_process)
+                    self.slots = threading.BoundedSemaphore(
+                        self.processes + self.queue_limit)
+                    self.pid = os.getpid()
+        return self.executor, self.slots
+
+    # Run function(*args) in a render process and return its result, raising
+    # RenderBusy if too many renders are already waiting or it takes too long
+    def render(self, function, *args):
+        executor, future = self._submit(function, *args)
+        try:
+            return future.result(timeout=const.RENDER_TIMEOUT)
+        except TimeoutError:
+            raise RenderBusy("Render timed out")
+        except BrokenProcessPool:
+            self._reset(executor)
+            raise RenderBusy("Render processes were restarted")
+
+    # Async version of render for the async server
+    async def render_async(self, function, *args):
+        executor, future = self._submit(function, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future),
+                                          const.RENDER_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise RenderBusy("Render timed out")
+        except BrokenProcessPool:
+            self._reset(executor)
+            raise RenderBusy("Render processes were restarted")
+
+    def _submit(self, function, *args):
+        executor, slots = self._get_executor()
+        if not slots.acquire(blocking=False):
+            raise RenderBusy("Too many renders are queued")
+        try:
+            future = executor.submit(function, *args)
+        except BrokenProcessPool:
+            slots.release()
+            self._reset(executor)
+            raise RenderBusy("Render processes were restarted")
+        # A slot is held until the render finishes, even if the request
+        # stopped waiting for it
+        future.add_done_callback(lambda _: slots.release())
+        return executor, future
+
+    # Replace a pool whose process died, on the next render
+    def _reset(self, executor):
+        with self.lock:
+            if self.executor is executor:
+                self.pid = None
+        executor.shutdown(wait=False)
+
+
+pool = RenderPool()
+
+
+def render(function, *args):
+    return pool.render(function, *args)
+
+
+async def render_async(function, *args):
+    return await pool.render_async(function, *args)
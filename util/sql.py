@@ -1,17 +1,123 @@
+import atexit
+import os
 import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
 import util.constants as const
 
+# In memory mode the database is kept in memory, shared by the threads of a
+# process. It is loaded from the database file by the first connection of a
+# process and copied back to the file every DB_SNAPSHOT_INTERVAL seconds and
+# when the process exits, so up to an interval of writes can be lost on a crash
+MEMORY_URI = 'file:/database?vfs=memdb'
+
+# Connection that keeps the in-memory database alive, the process it was
+# loaded by, and the data version last copied to the file
+memory_db = None
+memory_pid = None
+memory_version = None
+memory_lock = threading.Lock()
+
 
 def get_db():
+    if const.DB_MODE == 'memory':
+        if memory_pid != os.getpid():
+            load_memory_db()
+        return sqlite3.connect(
+            MEMORY_URI,
+            uri=True,
+            timeout=const.DB_TIMEOUT,
+            check_same_thread=False)
+    return get_file_db()
+
+
+def get_file_db():
     connection = sqlite3.connect(
         f'{const.DB_NAME}.db',
+        timeout=const.DB_TIMEOUT,
         check_same_thread=False)
     return connection
 
 
-def execute_query(query, params=()):
-    with get_db() as connection:
+# Create the schema and switch the database to WAL so that readers in other
+# worker processes are not blocked by a writer
+def init_db():
+    with closing(get_file_db()) as connection:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(const.SCHEMA)
+
+
+# Copy the database file into memory and start taking snapshots of it. The
+# copy is made with VACUUM INTO rather than the backup API, which would also
+# copy the WAL flag of the file, and WAL isn't supported in memory
+def load_memory_db():
+    global memory_db, memory_pid, memory_version
+    with memory_lock:
+        if memory_pid == os.getpid():
+            return
+        memory_db = sqlite3.connect(MEMORY_URI, uri=True, check_same_thread=False)
+        with closing(sqlite3.connect(f'file:{const.DB_NAME}.db', uri=True)) as connection:
+            connection.execute("VACUUM INTO ?", (MEMORY_URI,))
+        memory_version = memory_db.execute("PRAGMA data_version").fetchone()[0]
+        memory_pid = os.getpid()
+        threading.Thread(target=take_snapshots, daemon=True).start()
+        atexit.register(snapshot)
+
+
+def take_snapshots():
+    while True:
+        time.sleep(const.DB_SNAPSHOT_INTERVAL)
+        snapshot()
+
+
+# Copy the in-memory database to the database file with the backup API,
+# unless nothing was written since the last snapshot
+def snapshot():
+    global memory_version
+    if memory_pid != os.getpid():
+        return
+    with memory_lock:
+        version = memory_db.execute("PRAGMA data_version").fetchone()[0]
+        if version == memory_version:
+            return
+        with closing(get_file_db()) as connection:
+            memory_db.backup(connection)
+        memory_version = version
+
+
+# Run a group of statements as a single write transaction. BEGIN IMMEDIATE
+# takes the write lock up front so that a check (e.g. overlap) and the write
+# that depends on it cannot interleave with another worker's write
+@contextmanager
+def transaction():
+    with closing(get_db()) as connection:
+        connection.isolation_level = None
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+
+def execute_query(query, params=(), connection=None):
+    if connection is not None:
+        return connection.execute(query, params).fetchall()
+    with closing(get_db()) as connection:
         cursor = connection.execute(query, params)
         result = cursor.fetchall()
         connection.commit()
     return result
+
+
+# Generate the rows of a query one at a time instead of fetching them all at
+# once, for large results that are read once. The connection stays open until
+# the rows are consumed or the generator is closed
+def iterate_query(query, params=(), connection=None):
+    if connection is not None:
+        yield from connection.execute(query, params)
+        return
+    with closing(get_db()) as connection:
+        yield from connection.execute(query, params)
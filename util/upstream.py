@@ -0,0 +1,234 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import util.constants as const
+
+# The async client is optional, it is only used by the async server
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Clients for the external APIs. Each provider keeps a pool of connections,
+# bounds how long a request may take, and stops calling the provider for a
+# while once most of its recent requests have failed, so that a hanging
+# provider can't tie up every request thread
+
+
+class UpstreamError(Exception):
+    pass
+
+
+# Shut down the socket of a response whose body is still being read, so that
+# a blocked read returns at once. The socket is left for the response to close
+def abort(response):
+    try:
+        sock = socket.socket(fileno=response.raw.fileno())
+    except (OSError, ValueError):
+        # The response was already closed
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    finally:
+        sock.detach()
+
+
+class CircuitBreaker:
+    '''Fails fast once the recent error rate of a provider crosses a threshold'''
+
+    def __init__(self, error_rate=const.BREAKER_ERROR_RATE,
+                 min_calls=const.BREAKER_MIN_CALLS,
+                 window=const.BREAKER_WINDOW,
+                 cooldown=const.BREAKER_COOLDOWN):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        # Calls of the window counted per second as [second, calls, failures],
+        # so the memory used doesn't grow with the request rate
+        self.buckets = deque()
+        self.calls = 0
+        self.failures = 0
+        self.opened = None
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        return self.opened is not None
+
+    # Whether a call may go ahead, and whether it is the trial call that
+    # decides if an open circuit closes
+    def allow(self):
+        with self.lock:
+            if self.opened is None:
+                return True, False
+            if time.monotonic() - self.opened < self.cooldown:
+                return False, False
+            # Let one trial request through after the cooldown, and keep
+            # failing fast until its result is recorded
+            self.opened = time.monotonic()
+            return True, True
+
+    # Record the result of a call. While the circuit is open only the result
+    # of the trial counts; calls that started before it opened are ignored
+    def record(self, success, trial=False):
+        with self.lock:
+            now = time.monotonic()
+            if self.opened is not None:
+                if not trial:
+                    return
+                if success:
+                    self.opened = None
+                    self.buckets.clear()
+                    self.calls = self.failures = 0
+                else:
+                    self.opened = now
+                return
+            second = int(now)
+            if not self.buckets or self.buckets[-1][0] != second:
+                self.buckets.append([second, 0, 0])
+            bucket = self.buckets[-1]
+            bucket[1] += 1
+            self.calls += 1
+            if not success:
+                bucket[2] += 1
+                self.failures += 1
+            while self.buckets[0][0] < now - self.window:
+                _, calls, failures = self.buckets.popleft()
+                self.calls -= calls
+                self.failures -= failures
+            if (self.calls >= self.min_calls
+                    and self.failures / self.calls >= self.error_rate):
+                self.opened = now
+
+
+class Provider:
+    '''Pooled HTTP client for one external API'''
+
+    def __init__(self, name, timeout, connect_timeout=const.UPSTREAM_CONNECT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.breaker = CircuitBreaker()
+        self.session = requests.Session()
+        # Retry once on connection errors and gateway errors, never on reads
+        # that timed out, as those already used up the time budget
+        retry = Retry(total=1, read=0, backoff_factor=0.1,
+                      status_forcelist=(502, 503, 504), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=const.UPSTREAM_POOL_SIZE,
+                              max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    # Get the JSON body of url, raising UpstreamError if the provider is
+    # failing, the request fails or the whole response takes too long
+    def get_json(self, url):
+        allowed, trial = self.breaker.allow()
+        if not allowed:
+            raise UpstreamError(f"{self.name} is unavailable")
+        deadline = time.monotonic() + self.timeout
+        try:
+            with self.session.get(url, stream=True,
+                                  timeout=(self.connect_timeout, self.timeout)) as response:
+                if response.status_code != 200:
+                    raise UpstreamError(
+                        f"{self.name} responded with {response.status_code}")
+                # A body trickling in keeps each read within the read timeout
+                # while a chunk fills, so the connection is shut down when
+                # the deadline passes
+                timer = threading.Timer(max(deadline - time.monotonic(), 0),
+                                        abort, (response,))
+                timer.start()
+                try:
+                    body = bytearray()
+                    for chunk in response.iter_content(const.UPSTREAM_CHUNK_SIZE):
+                        body += chunk
+                        if time.monotonic() > deadline:
+                            raise UpstreamError(f"{self.name} timed out")
+                finally:
+                    # Wait for a running abort before the response is closed
+                    timer.cancel()
+                    timer.join()
+                data = json.loads(body)
+        except (requests.RequestException, ValueError, UpstreamError) as error:
+            self.breaker.record(False, trial)
+            if isinstance(error, UpstreamError):
+                raise
+            if time.monotonic() > deadline:
+                raise UpstreamError(f"{self.name} timed out") from error
+            raise UpstreamError(f"{self.name} request failed: {error}") from error
+        self.breaker.record(True, trial)
+        return data
+
+
+class AsyncProvider:
+    '''Async HTTP client for the external API of a provider, sharing its circuit'''
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.session = None
+
+    # The session is created on the event loop of the first request
+    def get_session(self):
+        if self.session is None:
+            provider = self.provider
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=const.ASYNC_UPSTREAM_POOL_SIZE),
+                timeout=aiohttp.ClientTimeout(total=provider.timeout,
+                                              sock_connect=provider.connect_timeout))
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    # Get the JSON body of url, raising UpstreamError if the provider is
+    # failing, the request fails or the whole response takes too long
+    async def get_json(self, url):
+        provider = self.provider
+        allowed, trial = provider.breaker.allow()
+        if not allowed:
+            raise UpstreamError(f"{provider.name} is unavailable")
+        try:
+            # Retry once on connection errors and gateway errors, as the
+            # threaded client does
+            for retry in (True, False):
+                try:
+                    async with self.get_session().get(url) as response:
+                        if retry and response.status in (502, 503, 504):
+                            await asyncio.sleep(0.1)
+                            continue
+                        if response.status != 200:
+                            raise UpstreamError(
+                                f"{provider.name} responded with {response.status}")
+                        data = json.loads(await response.read())
+                        break
+                except aiohttp.ClientConnectorError:
+                    if not retry:
+                        raise
+                    await asyncio.sleep(0.1)
+        except asyncio.TimeoutError as error:
+            provider.breaker.record(False, trial)
+            raise UpstreamError(f"{provider.name} timed out") from error
+        except (aiohttp.ClientError, ValueError, UpstreamError) as error:
+            provider.breaker.record(False, trial)
+            if isinstance(error, UpstreamError):
+                raise
+            raise UpstreamError(f"{provider.name} request failed: {error}") from error
+        provider.breaker.record(True, trial)
+        return data
+
+
+nager_date = Provider('Nager.Date', const.NAGER_DATE_TIMEOUT)
+seven_timer = Provider('7Timer', const.SEVEN_TIMER_TIMEOUT)
+async_nager_date = AsyncProvider(nager_date)
+async_seven_timer = AsyncProvider(seven_timer)
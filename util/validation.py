@@ -1,7 +1,10 @@
 from datetime import datetime
+import itertools
 import util.constants as const
 import re
 from util.sql import execute_query
+from util.recurrence import Recurrence, RECURRENCE_COLUMNS, active_events, parse_date, get_horizon
+import util.archive as archive
 
 # Validate String
 
@@ -52,6 +55,46 @@ def postcode(postcode_str):
 def state(state_str):
     return state_str.upper() in const.STATE_ABBREVIATIONS
 
+# Validate Positive Number
+
+
+def positive(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+# Validate Bounded Positive Number
+
+
+def bounded(value, maximum):
+    return positive(value) and value <= maximum
+
+# Validate Until Date, which may not be before the start of a series
+
+
+def until(until_str, start_str):
+    return parse_date(until_str) >= parse_date(start_str)
+
+# Validate Recurrence Rule
+
+
+def recurrence(data, start=None):
+    errors = {}
+    if data.get('freq') not in const.RECURRENCE_FREQUENCIES:
+        errors['freq'] = const.INVALID_FREQ_MSG.format(data.get('freq'))
+    if 'interval' in data and not bounded(data['interval'],
+                                          const.RECURRENCE_MAX_INTERVAL):
+        errors['interval'] = const.INVALID_INTERVAL_MSG.format(data['interval'])
+    if 'count' in data and not bounded(data['count'], const.RECURRENCE_MAX_COUNT):
+        errors['count'] = const.INVALID_COUNT_MSG.format(data['count'])
+    if 'until' in data and not date(data['until']):
+        errors['until'] = const.INVALID_UNTIL_MSG.format(data['until'])
+    elif 'until' in data and start is not None and not until(data['until'], start):
+        errors['until'] = const.INVALID_UNTIL_RANGE_MSG.format(data['until'])
+    if 'count' in data and 'until' in data:
+        errors['count-until'] = const.INVALID_COUNT_UNTIL_MSG
+    if 'exceptions' in data and not all(date(d) for d in data['exceptions']):
+        errors['exceptions'] = const.INVALID_EXCEPTIONS_MSG
+    return errors
+
 # Validate all data fields in a request
 
 
@@ -87,11 +130,42 @@ def all_data(data):
     if 'description' in data and not string(data['description']):
         errors['description'] = const.INVALID_DESCRIPTION_MSG.format(
             data['description'])
+    if 'recurrence' in data:
+        errors.update(recurrence(data['recurrence'],
+                                 data['date'] if date(data.get('date', '')) else None))
     if not data:
         errors['data'] = 'No payload data provided'
     return errors
 
-def is_event_overlap(params=()):
-    return execute_query(
-            "SELECT * FROM events WHERE date = ? AND time_from < ? AND time_to > ?",
-            params)
\ No newline at end of file
+# Check whether an event overlaps another event, including any occurrence of a
+# recurring event. A new series is compared up to its last occurrence, or up
+# to the recurrence horizon when it never ends. Returns the id of an
+# overlapping event, or None
+
+
+def is_event_overlap(params=(), recurrence=None, exclude=None, connection=None):
+    event_date, time_to, time_from = params
+    start = parse_date(event_date)
+    end = start
+    if recurrence is not None:
+        end = recurrence.last() or get_horizon(start)
+    rows = itertools.chain.from_iterable(
+        execute_query(
+            f"SELECT e.id, e.date, {RECURRENCE_COLUMNS} {active_events(table)}\
+            AND e.time_from < ? AND e.time_to > ? AND e.id IS NOT ?",
+            (str(end), str(start), str(start), time_to, time_from, exclude),
+            connection)
+        for table in archive.get_tables(start, end, connection))
+    for row in rows:
+        other = Recurrence.from_row(row[1], row[2:])
+        if other is None:
+            other_date = parse_date(row[1])
+            if (other_date == start if recurrence is None
+                    else recurrence.occurs_on(other_date)):
+                return row[0]
+        elif recurrence is None:
+            if other.occurs_on(start):
+                return row[0]
+        elif recurrence.shares_date(other, get_horizon(start)):
+            return row[0]
+    return None
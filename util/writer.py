@@ -0,0 +1,88 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import util.constants as const
+from util.sql import transaction
+
+# Group commit of writes. Request threads hand their write to a single writer
+# thread per process, which applies everything queued within a short window
+# in one transaction, so a burst of writes pays for one commit instead of one
+# per write. Each write runs against the state left by the writes before it
+# in the batch, so checks such as overlaps see the batch's own changes
+
+
+class BatchWriter:
+    '''Single writer thread that applies queued write operations in batches'''
+
+    def __init__(self, window=const.WRITE_BATCH_WINDOW, size=const.WRITE_BATCH_SIZE):
+        self.window = window
+        self.size = size
+        self.queue = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    # Run operation(connection) in the next batch and return its result once
+    # the batch has been committed
+    def submit(self, operation):
+        future = Future()
+        self._get_queue().put((operation, future))
+        return future.result()
+
+    # The writer thread is started on first use, and again in a worker
+    # process forked from a parent that already started one
+    def _get_queue(self):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.queue = queue.Queue()
+                    threading.Thread(target=self._run, args=(self.queue,),
+                                     daemon=True).start()
+                    self.pid = os.getpid()
+        return self.queue
+
+    def _run(self, operations):
+        while True:
+            batch = [operations.get()]
+            # Only wait for more writes when others are already queued, so a
+            # lone write is not delayed by the window
+            window = self.window if not operations.empty() else 0
+            deadline = time.monotonic() + window
+            while len(batch) < self.size:
+                try:
+                    batch.append(operations.get(
+                        timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            self._apply(batch)
+
+    def _apply(self, batch):
+        results = []
+        try:
+            with transaction() as connection:
+                for operation, future in batch:
+                    # A failing operation only rolls back its own changes
+                    connection.execute("SAVEPOINT operation")
+                    try:
+                        results.append((future, operation(connection), None))
+                    except Exception as error:
+                        connection.execute("ROLLBACK TO operation")
+                        results.append((future, None, error))
+                    connection.execute("RELEASE operation")
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+writer = BatchWriter()
+
+
+def execute_write(operation):
+    return writer.submit(operation)
@@ -0,0 +1,5 @@
+from app import app, init_app
+
+# WSGI entry point for multi-process servers, e.g. `gunicorn -c gunicorn.conf.py`
+init_app()
+application = app